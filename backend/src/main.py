@@ -1,26 +1,35 @@
 """Main FastAPI application with API routes."""
 
+import asyncio
 import logging
+import time
+from collections.abc import Callable
 from contextlib import asynccontextmanager
 from datetime import datetime
+from pathlib import Path
+from uuid import uuid4
 
-from celery.result import AsyncResult
 from fastapi import (Depends, FastAPI, File, HTTPException, Query, Request,
                      Response, UploadFile, status)
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 from slowapi.util import get_remote_address
+from sqlalchemy import text
 from sqlalchemy.orm import Session
 
-from src.services.celery_app import celery, transcribe_audio_task
-from src.services.file_service import FileService, get_file_service
+from src.services.celery_app import (celery, format_task_error, get_task_meta,
+                                     store_cached_result,
+                                     transcribe_audio_task)
+from src.services.file_service import (MIME_HEADER_SIZE, FileService,
+                                       get_file_service)
 from src.services.whisper_service import (WhisperModelService,
                                           get_whisper_service)
 from src.utils.db import TranscriptionRepository, get_db, init_db
-from src.utils.schemas import (HealthResponse, TaskStatusResponse,
-                               TranscriptionBatchResponse,
-                               TranscriptionResponse,
+from src.utils.schemas import (TRANSCRIPTION_LIST_ADAPTER, HealthResponse,
+                               TaskStatusResponse, TranscriptionBatchResponse,
+                               TranscriptionListItem, TranscriptionResponse,
                                TranscriptionSearchResponse,
                                TranscriptionTaskResponse)
 from src.utils.security import sanitize_search_query
@@ -37,6 +46,13 @@ settings = get_settings()
 # https://slowapi.readthedocs.io/en/latest/
 limiter = Limiter(key_func=get_remote_address)  # ip
 
+# health sub-check results, name -> (expires_at, healthy)
+# probes hit /health every few secs, no need to re-ping deps or broadcast to workers each time
+HEALTH_CHECK_TTL_S = 10
+WORKER_CHECK_TTL_S = 30
+WORKER_INSPECT_TIMEOUT_S = 0.5
+_health_cache: dict[str, tuple[float, bool]] = {}
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
@@ -60,6 +76,7 @@ app = FastAPI(
     description="Audio transcription API using Whisper Tiny model",
     version="1.0.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,  # orjson encodes long transcript lists much faster
 )
 
 app.state.limiter = limiter
@@ -79,41 +96,63 @@ async def root():
     return {"message": "Ok"}
 
 
-@app.get("/api/v1/health", response_model=HealthResponse, tags=["Health"])
-async def health_check(
-    response: Response,
-    whisper: WhisperModelService = Depends(get_whisper_service),
-    db: Session = Depends(get_db),
-) -> HealthResponse:
-    """Check API health status including all dependencies."""
-    # Check Whisper model
-    model_healthy = whisper.is_loaded
+async def _cached_check(name: str, ttl: float, check: Callable[[], bool]) -> bool:
+    """Run a blocking health sub-check in a thread, reusing the result for ttl seconds."""
+    cached = _health_cache.get(name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
 
-    # Check database
-    db_healthy = False
-    try:
-        from sqlalchemy import text
+    healthy = await asyncio.to_thread(check)
+    _health_cache[name] = (time.monotonic() + ttl, healthy)
+    return healthy
 
+
+def _check_database(db: Session) -> bool:
+    """Check database connectivity."""
+    try:
         db.execute(text("SELECT 1"))
-        db_healthy = True
+        return True
     except Exception as e:
         logger.error(f"Database health check failed: {e}")
+        return False
+
 
-    # Check Redis/Celery broker
-    redis_healthy = False
+def _check_broker() -> bool:
+    """Check Redis/Celery broker connectivity."""
     try:
         celery.broker_connection().ensure_connection(max_retries=1)
-        redis_healthy = True
+        return True
     except Exception as e:
         logger.error(f"Redis health check failed: {e}")
+        return False
 
-    # Check Celery workers
-    celery_workers_healthy = False
+
+def _check_workers() -> bool:
+    """Check that at least one Celery worker replies to inspect."""
     try:
-        stats = celery.control.inspect().stats()
-        celery_workers_healthy = stats is not None and len(stats) > 0
+        stats = celery.control.inspect(timeout=WORKER_INSPECT_TIMEOUT_S).stats()
+        return stats is not None and len(stats) > 0
     except Exception as e:
         logger.error(f"Celery worker health check failed: {e}")
+        return False
+
+
+@app.get("/api/v1/health", response_model=HealthResponse, tags=["Health"])
+async def health_check(
+    response: Response,
+    whisper: WhisperModelService = Depends(get_whisper_service),
+    db: Session = Depends(get_db),
+) -> HealthResponse:
+    """Check API health status including all dependencies."""
+    # Check Whisper model
+    model_healthy = whisper.is_loaded
+
+    # db, broker and workers are checked concurrently, results cached per TTL
+    db_healthy, redis_healthy, celery_workers_healthy = await asyncio.gather(
+        _cached_check("database", HEALTH_CHECK_TTL_S, lambda: _check_database(db)),
+        _cached_check("redis", HEALTH_CHECK_TTL_S, _check_broker),
+        _cached_check("celery_workers", WORKER_CHECK_TTL_S, _check_workers),
+    )
 
     issues: list[str] = []
     if not model_healthy:
@@ -142,6 +181,24 @@ async def health_check(
     )
 
 
+async def _validate_and_save(
+    file: UploadFile, file_service: FileService
+) -> tuple[str, str, Path, str]:
+    """Validate one upload and save it to disk.
+
+    Returns:
+        Tuple of (original filename, unique filename, file path, content hash)
+    """
+    # peek once, header is reused for MIME check and as first write
+    header = await file.read(MIME_HEADER_SIZE)
+    # libmagic + filename checks are sync, keep them off the event loop
+    await asyncio.to_thread(file_service.validate_file, file, header)
+    unique_filename, file_path, content_hash = await file_service.save_file(
+        file, header
+    )
+    return file.filename or unique_filename, unique_filename, file_path, content_hash
+
+
 @app.post(
     "/api/v1/transcribe",
     response_model=TranscriptionBatchResponse,
@@ -151,6 +208,7 @@ async def health_check(
         413: {"description": "File too large"},
         429: {"description": "Rate limit exceeded"},
         500: {"description": "Transcription failed"},
+        503: {"description": "Task queue unavailable"},
     },
 )
 @limiter.limit(lambda: settings.transcribe_rate_limit)
@@ -164,30 +222,106 @@ async def transcribe_audio(
 ) -> TranscriptionBatchResponse:
     """Upload and transcribe audio files asynchronously. Returns task IDs for status polling."""
     repo = TranscriptionRepository(db)
-    results = []
-
-    for file in files:
-        file_service.validate_file(file)
-        unique_filename, file_path = await file_service.save_file(file)
+    # files are validated and saved concurrently, order of results follows files
+    outcomes = await asyncio.gather(
+        *(_validate_and_save(file, file_service) for file in files),
+        return_exceptions=True,
+    )
+    # (original name, unique name, path, content hash)
+    saved: list[tuple[str, str, Path, str]] = [
+        outcome for outcome in outcomes if not isinstance(outcome, BaseException)
+    ]
+    errors = [outcome for outcome in outcomes if isinstance(outcome, BaseException)]
+    if errors:
+        # reject the whole batch, don't leave the other files orphaned on disk
+        for _, unique_filename, _, _ in saved:
+            file_service.delete_file(unique_filename)
+        raise errors[0]
+
+    content_hashes = [content_hash for _, _, _, content_hash in saved]
+    # same audio already transcribed, reuse its text instead of running whisper again
+    cached_texts = repo.get_completed_texts(content_hashes)
+
+    # task ids are minted here and stored by the INSERT, so a row never sits in
+    # "processing" without the id its task runs under
+    task_ids = [str(uuid4()) for _ in saved]
+
+    # one INSERT for the batch, cache hits go in already completed with their text
+    transcription_ids = repo.create_many(
+        [
+            {
+                "audio_filename": unique_filename,
+                "status": "completed" if content_hash in cached_texts else "processing",
+                "transcribed_text": cached_texts.get(content_hash),
+                "content_hash": content_hash,
+                "task_id": task_id,
+            }
+            for (_, unique_filename, _, content_hash), task_id in zip(saved, task_ids)
+        ]
+    )
+    statuses: dict[int, str] = {}
+
+    # rows are committed, now publish finished metas so status polling finds them
+    for (_, unique_filename, _, content_hash), transcription_id, task_id in zip(
+        saved, transcription_ids, task_ids
+    ):
+        if content_hash not in cached_texts:
+            continue
+        statuses[transcription_id] = "completed"
+        # duplicate audio is never read, the earlier upload's text is reused
+        file_service.delete_file(unique_filename)
+        try:
+            store_cached_result(transcription_id, cached_texts[content_hash], task_id)
+        except Exception as e:
+            # row is already completed, polling this task id just reports pending
+            logger.warning(
+                f"Could not store cached result for transcription {transcription_id}: {e}"
+            )
 
-        # Create database record with status="processing"
-        transcription = repo.create(
-            audio_filename=unique_filename, transcribed_text=None, status="processing"
+    # celery, producer connections are pooled by the app so dispatch reuses one
+    pending = [
+        (transcription_id, file_path, unique_filename, task_id)
+        for (_, unique_filename, file_path, _), transcription_id, task_id in zip(
+            saved, transcription_ids, task_ids
         )
-
-        # celery
-        task = transcribe_audio_task.delay(str(file_path), transcription.id)
-
-        repo.update_task_id(transcription.id, task.id)
-
-        results.append(
-            TranscriptionTaskResponse(
-                task_id=task.id,
-                transcription_id=transcription.id,
-                filename=file.filename or unique_filename,
-                status="processing",
+        if transcription_id not in statuses
+    ]
+    for index, (transcription_id, file_path, _, task_id) in enumerate(pending):
+        try:
+            transcribe_audio_task.apply_async(
+                args=(str(file_path), transcription_id), task_id=task_id
+            )
+        except Exception as e:
+            # broker went away mid batch, tasks already queued keep their rows,
+            # the rest are failed so nothing is left waiting on a task that never ran
+            undispatched = pending[index:]
+            logger.error(
+                f"Dispatch failed after {index}/{len(pending)} tasks: {e}",
+                exc_info=True,
             )
+            repo.bulk_fail(
+                [transcription_id for transcription_id, _, _, _ in undispatched],
+                "Could not queue transcription task",
+            )
+            for _, _, unique_filename, _ in undispatched:
+                file_service.delete_file(unique_filename)
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Transcription queue unavailable, please retry",
+            ) from e
+        statuses[transcription_id] = "processing"
+
+    results = [
+        TranscriptionTaskResponse(
+            task_id=task_id,
+            transcription_id=transcription_id,
+            filename=original_filename,
+            status=statuses[transcription_id],
         )
+        for (original_filename, _, _, _), transcription_id, task_id in zip(
+            saved, transcription_ids, task_ids
+        )
+    ]
 
     return TranscriptionBatchResponse(tasks=results)
 
@@ -202,19 +336,22 @@ async def get_task_status(
     db: Session = Depends(get_db),
 ) -> TaskStatusResponse:
     """Check status of a transcription task."""
-    task = AsyncResult(task_id, app=celery)
+    # one redis GET, no stored meta means celery has not picked it up yet
+    meta = get_task_meta(task_id)
+    state = meta["status"] if meta else "PENDING"
+    info = meta.get("result") if meta else None
     repo = TranscriptionRepository(db)
 
-    if task.state == "PENDING":
+    if state == "PENDING":
         return TaskStatusResponse(status="pending", task_id=task_id)
-    elif task.state == "PROCESSING":
+    elif state == "PROCESSING":
         return TaskStatusResponse(
             status="processing",
             task_id=task_id,
-            meta=task.info,  # transcribing or saving
+            meta=info,  # transcribing or saving
         )
-    elif task.state == "SUCCESS":
-        transcription = repo.get_by_task_id(task_id)
+    elif state == "SUCCESS":
+        transcription = repo.get_status_bundle(task_id)
         if transcription:
             return TaskStatusResponse(
                 status="completed",
@@ -223,17 +360,20 @@ async def get_task_status(
                 text=transcription.transcribed_text,
             )
         return TaskStatusResponse(status="completed", task_id=task_id)
-    elif task.state == "FAILURE":
-        transcription = repo.get_by_task_id(task_id)
-        error_msg = transcription.error_message if transcription else str(task.info)
+    elif state == "FAILURE":
+        transcription = repo.get_status_bundle(task_id)
+        if transcription:
+            error_msg = transcription.error_message
+        else:
+            error_msg = format_task_error(info)
         return TaskStatusResponse(status="failed", task_id=task_id, error=error_msg)
     else:
-        return TaskStatusResponse(status=task.state.lower(), task_id=task_id)
+        return TaskStatusResponse(status=state.lower(), task_id=task_id)
 
 
 @app.get(
     "/api/v1/transcriptions",
-    response_model=list[TranscriptionResponse],
+    response_model=list[TranscriptionResponse] | list[TranscriptionListItem],
     tags=["Transcriptions"],
 )
 async def list_transcriptions(
@@ -242,28 +382,21 @@ async def list_transcriptions(
     status: str | None = Query(
         None, description="Filter by status: completed, processing, failed"
     ),
+    include_text: bool = Query(
+        True, description="Set false to list id, filename, timestamp and status only"
+    ),
     db: Session = Depends(get_db),
-) -> list[TranscriptionResponse]:
+) -> ORJSONResponse:
     """Get all transcriptions, ordered by most recent first. Optional status filter."""
     repository = TranscriptionRepository(db)
-
-    if status:
-        transcriptions = repository.get_by_status(status, skip, limit)
+    if include_text:
+        rows = repository.get_rows(skip, limit, status)
     else:
-        transcriptions = repository.get_all(skip, limit)
-
-    return [
-        TranscriptionResponse(
-            id=t.id,
-            audio_filename=t.audio_filename,
-            transcribed_text=t.transcribed_text,
-            created_timestamp=t.created_timestamp,
-            status=t.status,
-            task_id=t.task_id,
-            error_message=t.error_message,
-        )
-        for t in transcriptions
-    ]
+        rows = repository.list_rows(skip, limit, status)
+
+    # rows come straight from our own db, skip per-row pydantic validation
+    # response_model above still documents the shape
+    return ORJSONResponse(content=rows)
 
 
 @app.get(
@@ -288,17 +421,8 @@ async def search_transcriptions(
     results = repository.search_by_filename(sanitized_query)
 
     return TranscriptionSearchResponse(
-        results=[
-            TranscriptionResponse(
-                id=t.id,
-                audio_filename=t.audio_filename,
-                transcribed_text=t.transcribed_text,
-                created_timestamp=t.created_timestamp,
-                status=t.status,
-                task_id=t.task_id,
-                error_message=t.error_message,
-            )
-            for t in results
-        ],
+        results=TRANSCRIPTION_LIST_ADAPTER.validate_python(
+            results, from_attributes=True
+        ),
         query=sanitized_query,
     )
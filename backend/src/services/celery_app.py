@@ -1,13 +1,22 @@
 """Celery application for async transcription tasks."""
 
+import random
+from uuid import uuid4
+
+import msgpack
+import redis
 from celery import Celery
+from celery.signals import worker_process_init
 
-from src.services.whisper_service import WhisperModelService
-from src.utils.db import TranscriptionRepository, get_db
+from src.services.inference_worker import transcribe_remote
+from src.services.whisper_service import get_whisper_service
+from src.utils.db import SessionLocal, TranscriptionRepository, get_engine
 from src.utils.settings import get_settings
 
 settings = get_settings()
 
+WHISPER_QUEUE = "whisper"
+
 celery = Celery(
     "transcription_tasks",
     broker=settings.celery_broker_url,
@@ -15,26 +24,129 @@ celery = Celery(
 )
 
 celery.conf.update(
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
+    # msgpack is smaller and faster to encode/decode than json for broker + results
+    task_serializer="msgpack",
+    accept_content=["msgpack", "json"],  # json kept for tasks queued before switch
+    result_serializer="msgpack",
     timezone="UTC",
     enable_utc=True,
     task_track_started=True,
     task_time_limit=3 * 60,  # 3 minutes max per task
     worker_prefetch_multiplier=1,  # how many it fetch from queue, so task dont get parked idle (task not in the superfast latency)
     result_expires=3600,  # 1 hour
+    # long whisper jobs get their own queue so short tasks on "default" are not stuck behind them
+    task_default_queue="default",
+    task_routes={"transcription_tasks.transcribe_audio": {"queue": WHISPER_QUEUE}},
 )
 
+# retry backoff bounds in seconds
+RETRY_BASE_DELAY_S = 1
+RETRY_MAX_DELAY_S = 30
+
+# a task attempt redelivered after this many lost workers (oom, decoder crash,
+# hard time limit) is failed instead of being requeued again
+MAX_WORKER_LOSSES = 2
+DELIVERY_KEY = "transcribe-deliveries:{task_id}:{attempt}"
+DELIVERY_KEY_TTL_S = 24 * 3600
+
+# plain client on the result backend, pooled, skips AsyncResult's per-attribute lookups
+_result_redis = redis.Redis.from_url(settings.celery_result_backend)
+
+
+@worker_process_init.connect
+def prewarm_whisper_model(**_) -> None:
+    """Load the Whisper model in each worker child before it takes a task.
+
+    Runs after fork, so CUDA is only initialised in the child. Workers that only
+    consume the default queue never run transcriptions and skip the load, as do
+    workers that hand transcriptions to the inference worker.
+    """
+    if WHISPER_QUEUE not in celery.amqp.queues.consume_from:
+        return
+    if settings.whisper_inference_stream:
+        return  # the inference worker holds the model
+    get_whisper_service()
+
+
+def get_task_meta(task_id: str) -> dict | None:
+    """Read a task's stored state straight from the Redis result backend.
+
+    Args:
+        task_id: Celery task ID
+
+    Returns:
+        dict: Stored meta with "status" and "result" keys, None if nothing stored yet (pending)
+    """
+    raw = _result_redis.get(celery.backend.get_key_for_task(task_id))
+    if raw is None:
+        return None
+    return msgpack.unpackb(raw)  # matches result_serializer above
+
+
+def store_cached_result(
+    transcription_id: int, text: str, task_id: str | None = None
+) -> str:
+    """Record an already-known transcription as a finished task so status polling works.
+
+    Args:
+        transcription_id: Database record ID
+        text: Transcribed text reused from an earlier upload of the same audio
+        task_id: ID already stored on the row, a new one is generated if omitted
+
+    Returns:
+        str: Task ID, stored as SUCCESS with the same result shape as the task
+    """
+    task_id = task_id or str(uuid4())
+    celery.backend.store_result(
+        task_id,
+        {"status": "completed", "transcription_id": transcription_id, "text": text},
+        "SUCCESS",
+    )
+    return task_id
+
+
+def count_delivery(task_id: str, attempt: int) -> int:
+    """Count deliveries of one task attempt, each redelivery means a worker was lost.
+
+    Args:
+        task_id: Celery task ID
+        attempt: Retry number, a retry is a new message and starts its own count
+
+    Returns:
+        int: Deliveries so far including this one
+    """
+    key = DELIVERY_KEY.format(task_id=task_id, attempt=attempt)
+    pipe = _result_redis.pipeline()
+    pipe.incr(key)
+    pipe.expire(key, DELIVERY_KEY_TTL_S)
+    count, _ = pipe.execute()
+    return count
+
+
+def clear_deliveries(task_id: str, attempt: int) -> None:
+    """Drop the delivery count once an attempt finished without losing its worker."""
+    _result_redis.delete(DELIVERY_KEY.format(task_id=task_id, attempt=attempt))
+
+
+def next_retry_delay(prev_delay: float) -> float:
+    """Decorrelated jitter backoff: min(cap, uniform(base, prev * 3)) seconds."""
+    return min(RETRY_MAX_DELAY_S, random.uniform(RETRY_BASE_DELAY_S, prev_delay * 3))
+
+
+def format_task_error(result: dict) -> str:
+    """Render a stored FAILURE result ({"exc_type", "exc_message": [args]}) as text."""
+    exc_args = result.get("exc_message") or []
+    if isinstance(exc_args, str):
+        return exc_args
+    return ", ".join(str(arg) for arg in exc_args) or result.get("exc_type", "")
+
 
 @celery.task(
     bind=True,
     name="transcription_tasks.transcribe_audio",
-    autoretry_for=(Exception,),
-    max_retries=3,
-    retry_backoff=True,
-    retry_backoff_max=30,
-    retry_jitter=True,  # add randomness to avoid overwhlming
+    acks_late=True,  # ack after run, so a worker crash mid-transcription requeues it
+    reject_on_worker_lost=True,
+    max_retries=3,  # retried manually below with decorrelated jitter
 )
 def transcribe_audio_task(self, file_path: str, transcription_id: int) -> dict:
     """Background task to transcribe audio file.
@@ -46,34 +158,48 @@ def transcribe_audio_task(self, file_path: str, transcription_id: int) -> dict:
     Returns:
         dict: Task result with status and transcribed text
     """
-    try:
-        whisper_service = WhisperModelService()
-        self.update_state(state="PROCESSING", meta={"status": "Transcribing audio"})
-        transcribed_text = whisper_service.transcribe(file_path)
-
-        self.update_state(state="PROCESSING", meta={"status": "Saving results"})
+    task_id, attempt = self.request.id, self.request.retries
+    # one session per task, shared by the success and failure paths
+    with SessionLocal(bind=get_engine()) as db:
+        repo = TranscriptionRepository(db)
+        # acks_late + reject_on_worker_lost requeue the task when its worker dies,
+        # a file that kills every worker would otherwise come back forever
+        if count_delivery(task_id, attempt) > MAX_WORKER_LOSSES:
+            error = f"Worker lost {MAX_WORKER_LOSSES} times transcribing this file"
+            repo.finalize(transcription_id, "failed", error=error)
+            raise RuntimeError(error)
 
-        db = next(get_db())  # next for generator, grab yielded sess
         try:
-            repo = TranscriptionRepository(db)
-            repo.update_transcription_text(transcription_id, transcribed_text)
-            repo.update_transcription_status(transcription_id, "completed")
-        finally:
-            db.close()
+            self.update_state(state="PROCESSING", meta={"status": "Transcribing audio"})
+            if settings.whisper_inference_stream:
+                # model lives in the inference worker, this task only hands over the file
+                transcribed_text = transcribe_remote(file_path)
+            else:
+                transcribed_text = get_whisper_service().transcribe(file_path)
 
-        return {
-            "status": "completed",
-            "transcription_id": transcription_id,
-            "text": transcribed_text,
-        }
+            self.update_state(state="PROCESSING", meta={"status": "Saving results"})
+            repo.finalize(transcription_id, "completed", text=transcribed_text)
 
-    except Exception as e:
-        db = next(get_db())
-        try:
-            repo = TranscriptionRepository(db)
-            repo.update_transcription_status(transcription_id, "failed")
-            repo.update_transcription_error(transcription_id, str(e))
-        finally:
-            db.close()
+            return {
+                "status": "completed",
+                "transcription_id": transcription_id,
+                "text": transcribed_text,
+            }
 
-        raise  # go into retry
+        except Exception as e:
+            db.rollback()  # clear a half-done finalize before recording the failure
+            repo.finalize(transcription_id, "failed", error=str(e))
+
+            # decorrelated jitter spreads retries of a shared outage instead of firing together
+            # previous delay rides along in a message header, a worker exposes custom
+            # headers on the request itself, eager apply() keeps them under .headers
+            prev_delay = (
+                getattr(self.request, "retry_delay", None)
+                or (self.request.headers or {}).get("retry_delay")
+                or RETRY_BASE_DELAY_S
+            )
+            delay = next_retry_delay(prev_delay)
+            raise self.retry(exc=e, countdown=delay, headers={"retry_delay": delay})
+        finally:
+            # reached only when the worker survived, a lost worker leaves the count
+            clear_deliveries(task_id, attempt)
@@ -1,13 +1,18 @@
 """Secure file handling service."""
 
+import asyncio
+import hashlib
 import logging
 import os
+import string
+from contextlib import suppress
 from datetime import datetime
+from functools import lru_cache
 from pathlib import Path
 from secrets import token_hex
+from typing import BinaryIO
 
 import magic
-import re2 as re
 from fastapi import HTTPException, UploadFile, status
 
 from src.utils.settings import get_settings
@@ -21,22 +26,48 @@ ALLOWED_EXTENSIONS = (".mp3",)
 
 # Maximum chunk size for reading files (64KB)
 CHUNK_SIZE = 64 * 1024
+# Bytes peeked from the start of an upload for MIME detection
+MIME_HEADER_SIZE = 2048
+
+# load the magic db once at import instead of on the first upload
+# Magic.from_buffer holds a per-instance lock, so sharing it across threads is safe
+_MIME_DETECTOR = magic.Magic(mime=True)
+
+# Filename characters kept as-is: alphanumeric, dash, underscore, period
+_ALLOWED_FILENAME_CHARS = frozenset(string.ascii_letters + string.digits + "._-")
+
+
+class _SafeFilenameTable(dict):
+    """str.translate table mapping every disallowed character to an underscore."""
+
+    def __missing__(self, codepoint: int) -> str:
+        # only reached for non latin-1 chars, which are never allowed
+        return "_"
+
+
+_SAFE_TRANSLATE = _SafeFilenameTable(
+    {c: "_" for c in range(256) if chr(c) not in _ALLOWED_FILENAME_CHARS}
+    | {ord(c): c for c in _ALLOWED_FILENAME_CHARS}
+)
 
 
 class FileService:
     """Secure file handling service."""
 
     def __init__(self) -> None:
-        """Initialize file service and ensure upload directory exists."""
+        """Initialize file service, upload directory is created by Settings."""
         self._settings = get_settings()
-        self._upload_dir = Path(self._settings.upload_dir)
-        self._upload_dir.mkdir(parents=True, exist_ok=True)
+        self._upload_dir = self._settings.upload_dir
 
-    def validate_file(self, file: UploadFile) -> None:
+    def validate_file(self, file: UploadFile, header: bytes) -> None:
         """Validate uploaded file.
 
+        Size comes from the multipart parser, save_file still enforces it while
+        streaming for uploads where it is unknown.
+
         Args:
             file: Uploaded file to validate
+            header: First MIME_HEADER_SIZE bytes already read from the upload
 
         Raises:
             HTTPException: If validation fails
@@ -50,7 +81,7 @@ class FileService:
         # Check extension, size, type
         self._validate_extension(file.filename)
         self._validate_file_size(file)
-        self._validate_mime_type(file)
+        self._validate_mime_type(header)
 
     def _validate_extension(self, filename: str) -> None:
         """Validate file extension."""
@@ -64,29 +95,22 @@ class FileService:
             )
 
     def _validate_file_size(self, file: UploadFile) -> None:
-        """Validate file size using chunked reading."""
-        max_size = self._settings.max_upload_size_bytes
-        total_size = 0
-
-        # Read in chunks to avoid memory exhaustion
-        file.file.seek(0, os.SEEK_END)
-        total_size = file.file.tell()
-        file.file.seek(0)  # Reset file pointer
-
-        if total_size > max_size:
-            raise HTTPException(
-                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
-                detail=f"File too large. Maximum size: {self._settings.max_upload_size_mb}MB",
-            )
+        """Validate file size using the size recorded while the upload was parsed."""
+        # no seek/tell on the spooled file, starlette already counted the bytes
+        if file.size is not None and file.size > self._settings.max_upload_size_bytes:
+            raise self._file_too_large()
+
+    def _file_too_large(self) -> HTTPException:
+        """Build the 413 error raised when an upload exceeds the size limit."""
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File too large. Maximum size: {self._settings.max_upload_size_mb}MB",
+        )
 
     # not comprehensive, future can consider parse and discard original/some kind of malware s
-    def _validate_mime_type(self, file: UploadFile) -> None:
-        """Validate MIME type using python-magic."""
-        # Read first 2048 bytes to determine file type
-        header = file.file.read(2048)
-        file.file.seek(0)  # Reset file pointer to the start
-
-        mime_type = magic.from_buffer(header, mime=True)
+    def _validate_mime_type(self, header: bytes) -> None:
+        """Validate MIME type of the upload header using python-magic."""
+        mime_type = _MIME_DETECTOR.from_buffer(header)
 
         if mime_type not in ALLOWED_MIME_TYPES:
             logger.warning(f"Invalid MIME type detected: {mime_type}")
@@ -116,10 +140,11 @@ class FileService:
         # Keep only safe characters: alphanumeric, dash, underscore, period
         # Remove any HTML/script characters
         # here our 'sample 3.mp3' becomes 'sample_3.mp3' becos space not allowed
-        safe_name = re.sub(r"[^a-zA-Z0-9._-]", "_", safe_name)
+        safe_name = safe_name.translate(_SAFE_TRANSLATE)
 
         # collapse multiple underscores
-        safe_name = re.sub(r"_+", "_", safe_name)
+        while "__" in safe_name:
+            safe_name = safe_name.replace("__", "_")
 
         # leading/trailing underscores and periods
         safe_name = safe_name.strip("_.")
@@ -153,17 +178,20 @@ class FileService:
 
         return f"{stem}_{timestamp}_{random_suffix}{suffix}"
 
-    async def save_file(self, file: UploadFile) -> tuple[str, Path]:
-        """Save uploaded file securely.
+    async def save_file(
+        self, file: UploadFile, header: bytes = b""
+    ) -> tuple[str, Path, str]:
+        """Save uploaded file securely, enforcing the size limit while streaming.
 
         Args:
             file: Uploaded file to save
+            header: Bytes already read from the upload (written first)
 
         Returns:
-            Tuple of (unique_filename, file_path)
+            Tuple of (unique_filename, file_path, content_hash), hash is SHA-256 hex
 
         Raises:
-            HTTPException: If save fails
+            HTTPException: If file is too large or save fails
         """
         if not file.filename:
             raise HTTPException(
@@ -175,24 +203,109 @@ class FileService:
         unique_filename = self.generate_unique_filename(file.filename)
         file_path = self._upload_dir / unique_filename
 
+        # blocking disk IO runs in a worker thread so the event loop keeps serving
+        write = asyncio.ensure_future(
+            asyncio.to_thread(self._write_upload, file.file, header, file_path)
+        )
         try:
-            # save in small chunks to use low memory
-            with open(file_path, "wb") as buffer:
-                while chunk := await file.read(CHUNK_SIZE):
-                    buffer.write(chunk)
+            content_hash = await asyncio.shield(write)
 
             logger.info(f"File saved: {unique_filename}")
-            return unique_filename, file_path
+            return unique_filename, file_path, content_hash
+
+        except asyncio.CancelledError:
+            # client went away, the thread can't be stopped so wait for it and drop the file
+            with suppress(Exception):
+                await write
+            file_path.unlink(missing_ok=True)
+            raise
+
+        except HTTPException:
+            raise
 
         except Exception as e:
-            if file_path.exists():
-                file_path.unlink()  # delete partial file
             logger.error(f"Failed to save file: {e}")
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail="Failed to save file",
             )
 
+    def _write_upload(self, src: BinaryIO, header: bytes, file_path: Path) -> str:
+        """Write header + remaining upload body to disk, enforcing the size limit.
+
+        Content goes to a .tmp sibling first and is renamed into place once complete,
+        so a failed or oversized upload never leaves a partial file under the real name.
+
+        Returns:
+            SHA-256 hex digest of the saved content
+        """
+        max_size = self._settings.max_upload_size_bytes
+        digest = hashlib.sha256(header)
+        tmp_path = file_path.with_name(f"{file_path.name}.tmp")
+
+        try:
+            with open(tmp_path, "w+b") as buffer:
+                buffer.write(header)
+                if self._copy_in_kernel(src, buffer, len(header), max_size):
+                    # bytes never passed through python, hash what landed on disk
+                    buffer.seek(0)
+                    digest = hashlib.file_digest(buffer, "sha256")
+                else:
+                    # save in small chunks to use low memory, abort as soon as limit is passed
+                    total_size = len(header)
+                    while chunk := src.read(CHUNK_SIZE):
+                        total_size += len(chunk)
+                        if total_size > max_size:
+                            raise self._file_too_large()
+                        digest.update(chunk)
+                        buffer.write(chunk)
+
+            # atomic on the same filesystem
+            os.rename(tmp_path, file_path)
+        except BaseException:
+            tmp_path.unlink(missing_ok=True)
+            raise
+
+        return digest.hexdigest()
+
+    def _copy_in_kernel(
+        self, src: BinaryIO, dst: BinaryIO, written: int, max_size: int
+    ) -> bool:
+        """Copy the rest of a disk-backed upload with os.copy_file_range.
+
+        Returns False when the fast path is unavailable (not Linux, upload still
+        in memory, or the kernel refuses e.g. across filesystems) so the caller
+        falls back to the chunked copy.
+        """
+        copy_file_range = getattr(os, "copy_file_range", None)  # linux only
+        # same check starlette uses, fileno() on an in-memory spool forces a rollover
+        if copy_file_range is None or not getattr(src, "_rolled", True):
+            return False
+
+        src_fd = src.fileno()
+        start = src.tell()
+        remaining = os.fstat(src_fd).st_size - start
+        if written + remaining > max_size:
+            raise self._file_too_large()
+
+        dst.flush()
+        offset = start
+        try:
+            while remaining > 0:
+                copied = copy_file_range(src_fd, dst.fileno(), remaining, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                remaining -= copied
+        except OSError as e:
+            logger.debug(f"copy_file_range unavailable, falling back: {e}")
+            src.seek(start)
+            dst.seek(written)
+            dst.truncate()
+            return False
+
+        return True
+
     def delete_file(self, filename: str) -> bool:
         """Delete file from upload directory.
 
@@ -212,6 +325,8 @@ class FileService:
         return False
 
 
+# FileService only holds settings + upload dir, so one instance serves every request
+@lru_cache(maxsize=1)
 def get_file_service() -> FileService:
-    """Get file service instance."""
+    """Get cached file service instance."""
     return FileService()
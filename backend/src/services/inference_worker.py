@@ -0,0 +1,163 @@
+"""Dedicated inference worker: one loaded Whisper model serving jobs from a Redis stream.
+
+Celery workers each load their own model copy. With WHISPER_INFERENCE_STREAM=true they
+hand the file path to this process instead, so one GPU-resident model serves them all.
+
+Run with: python -m src.services.inference_worker
+"""
+
+import logging
+import os
+import socket
+import time
+from uuid import uuid4
+
+import redis
+
+from src.services.whisper_service import (WhisperModelService,
+                                          get_whisper_service)
+from src.utils.settings import get_settings
+
+logger = logging.getLogger(__name__)
+settings = get_settings()
+
+JOB_STREAM = "asr-in"
+JOB_GROUP = "asr"
+# per-job reply stream, one entry with either "text" or "error"
+REPLY_STREAM = "asr-out:{job_id}"
+REPLY_TTL_S = 600  # producer gave up or crashed, don't keep replies forever
+# stays under celery's task_time_limit (3 min) so the task records the failure itself
+REPLY_TIMEOUT_S = 170
+READ_BLOCK_MS = 100
+# pending entries idle this long belong to a dead consumer, take them over
+CLAIM_IDLE_MS = 90_000
+CLAIM_INTERVAL_S = 30
+
+_redis = redis.Redis.from_url(settings.celery_broker_url)
+
+
+def transcribe_remote(audio_path: str) -> str:
+    """Send an audio file to the inference worker and wait for its text.
+
+    Args:
+        audio_path: Path to the audio file, must be visible to the inference worker
+
+    Returns:
+        Transcribed text string
+
+    Raises:
+        TimeoutError: If no reply arrives within REPLY_TIMEOUT_S
+        RuntimeError: If the inference worker failed to transcribe the file
+    """
+    job_id = uuid4().hex
+    reply_stream = REPLY_STREAM.format(job_id=job_id)
+    _redis.xadd(JOB_STREAM, {"job_id": job_id, "path": audio_path})
+
+    reply = _redis.xread({reply_stream: "0"}, count=1, block=REPLY_TIMEOUT_S * 1000)
+    _redis.delete(reply_stream)
+    if not reply:
+        raise TimeoutError(f"No transcription reply within {REPLY_TIMEOUT_S}s")
+
+    _, entries = reply[0]
+    _, fields = entries[0]
+    if b"error" in fields:
+        raise RuntimeError(fields[b"error"].decode())
+    return fields[b"text"].decode()
+
+
+def _is_stale(msg_id: bytes, now_ms: int) -> bool:
+    """True if the job's producer has already given up waiting (id is its add time)."""
+    added_ms = int(msg_id.split(b"-", 1)[0])
+    return now_ms - added_ms > REPLY_TIMEOUT_S * 1000
+
+
+def _claim_abandoned(consumer: str) -> list[tuple[bytes, dict]]:
+    """Take over jobs left pending by a consumer that died before acking them."""
+    claimed: list[tuple[bytes, dict]] = []
+    start_id = "0-0"
+    while True:
+        # redis 7 adds a third element with ids deleted while pending
+        next_id, entries, *_ = _redis.xautoclaim(
+            JOB_STREAM, JOB_GROUP, consumer, CLAIM_IDLE_MS, start_id=start_id
+        )
+        claimed.extend(entry for entry in entries if entry[0] is not None)
+        if next_id in (b"0-0", "0-0"):
+            return claimed
+        start_id = next_id
+
+
+def _process(whisper: WhisperModelService, entries: list[tuple[bytes, dict]]) -> None:
+    """Transcribe a batch of stream entries and reply to each producer."""
+    pipe = _redis.pipeline()
+    now_ms = int(time.time() * 1000)
+    jobs = []
+    for msg_id, fields in entries:
+        # producer timed out (its celery retry queued a fresh job) or the entry is gone
+        if not fields or _is_stale(msg_id, now_ms):
+            logger.warning(f"Dropping stale inference job {msg_id.decode()}")
+            pipe.xack(JOB_STREAM, JOB_GROUP, msg_id)
+            pipe.xdel(JOB_STREAM, msg_id)
+            continue
+        # submit all before waiting, the batcher folds them into one pipeline call
+        jobs.append(
+            (
+                msg_id,
+                fields[b"job_id"].decode(),
+                whisper.submit(fields[b"path"].decode()),
+            )
+        )
+
+    for msg_id, job_id, future in jobs:
+        try:
+            reply = {"text": future.result()}
+        except Exception as e:
+            logger.error(f"Inference job {job_id} failed: {e}")
+            reply = {"error": str(e)}
+        reply_stream = REPLY_STREAM.format(job_id=job_id)
+        pipe.xadd(reply_stream, reply)
+        pipe.expire(reply_stream, REPLY_TTL_S)
+        pipe.xack(JOB_STREAM, JOB_GROUP, msg_id)
+        pipe.xdel(JOB_STREAM, msg_id)
+    pipe.execute()
+
+
+def run(consumer: str) -> None:
+    """Consume jobs forever, batching whatever arrived together into one pipeline call."""
+    try:
+        _redis.xgroup_create(JOB_STREAM, JOB_GROUP, id="0", mkstream=True)
+    except redis.ResponseError as e:
+        if "BUSYGROUP" not in str(e):  # group already exists
+            raise
+
+    whisper = get_whisper_service()
+    logger.info(f"Inference worker {consumer} ready on {whisper.device}")
+
+    next_claim = 0.0  # sweep at startup, then every CLAIM_INTERVAL_S
+    while True:
+        if time.monotonic() >= next_claim:
+            claimed = _claim_abandoned(consumer)
+            if claimed:
+                logger.info(f"Claimed {len(claimed)} abandoned inference jobs")
+                _process(whisper, claimed)
+            next_claim = time.monotonic() + CLAIM_INTERVAL_S
+
+        messages = _redis.xreadgroup(
+            JOB_GROUP,
+            consumer,
+            {JOB_STREAM: ">"},
+            count=settings.whisper_max_batch_size,
+            block=READ_BLOCK_MS,
+        )
+        if not messages:
+            continue
+
+        _, entries = messages[0]
+        _process(whisper, entries)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    run(f"{socket.gethostname()}-{os.getpid()}")
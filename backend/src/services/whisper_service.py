@@ -1,52 +1,135 @@
-"""Thread-safe singleton service for Whisper model."""
+"""Per-process cached service for Whisper model."""
 
 import logging
 import os
+import queue
 import threading
+import time
+from collections import deque
+from collections.abc import Callable, Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
 from pathlib import Path
 from typing import Any
 
+import numpy as np
 import torch
 from transformers import pipeline
+from transformers.pipelines.audio_utils import ffmpeg_read
 
 from src.utils.settings import get_settings
 
 logger = logging.getLogger(__name__)
 
 
-class WhisperModelService:
-    """Thread-safe singleton pattern for Whisper model caching.
+class _RequestBatcher:
+    """Micro-batcher that folds concurrent transcribe calls into one pipeline call.
 
-    Loading once per application lifecycle saves memory and improves response time for subsequent requests.
+    A background thread waits for the first request, then keeps collecting for up
+    to max_wait_s (or until max_batch) so concurrent callers share one GPU dispatch.
     """
 
-    _instance: "WhisperModelService | None" = None
-    _lock: threading.Lock = threading.Lock()
-    _initialized: bool = False
+    def __init__(
+        self,
+        run_batch: Callable[[list[str]], list[str]],
+        max_wait_s: float,
+        max_batch: int,
+    ) -> None:
+        """Start the batching thread."""
+        self._run_batch = run_batch
+        self._max_wait_s = max_wait_s
+        self._max_batch = max_batch
+        self._queue: queue.Queue[tuple[str, Future]] = queue.Queue()
+        self._thread = threading.Thread(
+            target=self._loop, name="whisper-batcher", daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, audio_path: str) -> Future:
+        """Queue an audio file, the future resolves to its transcribed text."""
+        future: Future = Future()
+        self._queue.put((audio_path, future))
+        return future
 
-    def __new__(cls) -> "WhisperModelService":
-        """Create singleton instance with double-checked locking."""
-        if cls._instance is None:
-            with cls._lock:
-                if cls._instance is None:
-                    cls._instance = super().__new__(cls)
-        return cls._instance
+    def _drain(self) -> list[tuple[str, Future]]:
+        """Block for one request, then collect more until the window closes.
 
-    def __init__(self) -> None:
-        """Initialize model on first instantiation."""
-        if self._initialized:
-            return
+        Requests already queued are always taken, so with max_wait_s=0 a lone
+        request runs at once and a burst submitted together still shares a batch.
+        """
+        items = [self._queue.get()]
+        deadline = time.monotonic() + self._max_wait_s
+        while len(items) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    items.append(self._queue.get(timeout=remaining))
+                else:
+                    items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _loop(self) -> None:
+        """Run batches forever, resolving each caller's future."""
+        while True:
+            items = self._drain()
+            if len(items) == 1:
+                self._run_individually(items)
+                continue
+
+            try:
+                texts = self._run_batch([path for path, _ in items])
+            except Exception:
+                # one bad file shouldn't fail the others, retry them one by one
+                self._run_individually(items)
+                continue
+
+            if len(texts) != len(items):
+                # zip would leave the extra callers' futures unresolved forever
+                logger.error(
+                    f"Batch of {len(items)} returned {len(texts)} texts, rerunning one by one"
+                )
+                self._run_individually(items)
+                continue
+
+            for (_, future), text in zip(items, texts):
+                future.set_result(text)
+
+    def _run_individually(self, items: list[tuple[str, Future]]) -> None:
+        """Run each request on its own so errors land on the right caller."""
+        for path, future in items:
+            try:
+                future.set_result(self._run_batch([path])[0])
+            except Exception as e:
+                future.set_exception(e)
+
+
+class WhisperModelService:
+    """Whisper model wrapper, built once per process by get_whisper_service.
 
-        with self._lock:
-            if self._initialized:
-                return
+    Loading once per application lifecycle saves memory and improves response time for subsequent requests.
+    """
 
-            self._settings = get_settings()
-            self._device = self._setup_device()
-            self._pipeline = self._load_model()
-            self._initialized = True
+    def __init__(self) -> None:
+        """Load the model on the best available device."""
+        self._settings = get_settings()
+        self._device = self._setup_device()
+        self._pipeline = self._load_model()
+        # one thread decodes upcoming files while the model runs, threads are safe
+        # inside celery's daemonic prefork workers where child processes are not
+        self._decoder = (
+            ThreadPoolExecutor(max_workers=1, thread_name_prefix="whisper-decode")
+            if self._settings.whisper_prefetch_audio
+            else None
+        )
+        self._batcher = _RequestBatcher(
+            self._transcribe_batch,
+            max_wait_s=self._settings.whisper_batch_max_wait_ms / 1000,
+            max_batch=self._settings.whisper_max_batch_size,
+        )
 
-            logger.info(f"WhisperModelService initialized on device: {self._device}")
+        logger.info(f"WhisperModelService initialized on device: {self._device}")
 
     def _setup_device(self) -> str:
         """Select best available device: CUDA -> MPS -> CPU."""
@@ -60,27 +143,101 @@ class WhisperModelService:
             logger.info("Using MPS device (Apple Silicon)")
         else:
             device = "cpu"
+            self._tune_cpu_threads()
             logger.info("Using CPU device")
         return device
 
+    def _tune_cpu_threads(self) -> None:
+        """Cap torch intra-op threads and enable oneDNN for CPU inference.
+
+        Default is one thread per core, with 2 worker processes on a small container
+        that oversubscribes and thrashes cache. Half the cores per process by default.
+        """
+        num_threads = self._settings.torch_num_threads or max(
+            1, (os.cpu_count() or 2) // 2
+        )
+        torch.set_num_threads(num_threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            # only settable before the first parallel op in this process
+            logger.debug("Inter-op threads already started, leaving as is")
+        torch.backends.mkldnn.enabled = True
+        logger.info(f"CPU inference with {num_threads} threads")
+
     def _load_model(self) -> Any:
         """Load Whisper pipeline with caching."""
-        cache_dir = Path(self._settings.model_cache_dir)
-        cache_dir.mkdir(parents=True, exist_ok=True)
+        cache_dir = self._settings.model_cache_dir  # created by Settings
+
+        # lazy %-formatting, skipped when INFO is off
+        logger.info("Loading model: %s", self._settings.whisper_model_name)
+        logger.info("Cache directory: %s", cache_dir)
 
-        logger.info(f"Loading model: {self._settings.whisper_model_name}")
-        logger.info(f"Cache directory: {cache_dir}")
+        if self._settings.whisper_backend == "faster-whisper":
+            return self._load_faster_whisper(cache_dir)
+
+        # half precision on accelerators, fp32 only on cpu
+        if self._device == "cuda":
+            dtype = torch.float16
+        elif self._device == "mps":
+            dtype = torch.bfloat16
+        else:
+            dtype = torch.float32
 
         pipe = pipeline(
             "automatic-speech-recognition",
             model=self._settings.whisper_model_name,
             device=self._device,
+            dtype=dtype,  # torch_dtype in transformers < 5
             model_kwargs={"cache_dir": str(cache_dir)},
         )
 
-        logger.info("Model loaded successfully")
+        if self._device == "cuda" and self._settings.whisper_torch_compile:
+            self._compile_encoder(pipe)
+
+        logger.info(f"Model loaded successfully ({pipe.model.dtype})")
         return pipe
 
+    def _compile_encoder(self, pipe: Any) -> None:
+        """Compile the encoder with CUDA graphs and warm it up on a silent window.
+
+        Every chunk is padded to chunk_length_s, so the encoder always sees the same
+        input shape and one captured graph replays for every window.
+        """
+        encoder = pipe.model.model.encoder
+        encoder.forward = torch.compile(
+            encoder.forward, mode="reduce-overhead", fullgraph=False
+        )
+
+        # compile + capture now, not on the first real request
+        sampling_rate = pipe.feature_extractor.sampling_rate
+        silence = np.zeros(
+            self._settings.whisper_chunk_length_s * sampling_rate, dtype=np.float32
+        )
+        pipe({"raw": silence, "sampling_rate": sampling_rate})
+        logger.info("Encoder compiled with torch.compile (reduce-overhead)")
+
+    def _load_faster_whisper(self, cache_dir: Path) -> Any:
+        """Load the CTranslate2 model, int8 on CPU and float16 on CUDA."""
+        # optional extra: uv sync --extra faster-whisper
+        from faster_whisper import WhisperModel
+
+        # openai/whisper-tiny -> tiny, the names faster-whisper resolves itself
+        model_size = self._settings.whisper_model_name.split("/")[-1]
+        model_size = model_size.removeprefix("whisper-")
+        # ctranslate2 has no mps backend
+        device = "cuda" if self._device == "cuda" else "cpu"
+
+        model = WhisperModel(
+            model_size,
+            device=device,
+            compute_type="float16" if device == "cuda" else "int8",
+            download_root=str(cache_dir),
+        )
+
+        logger.info(f"Model loaded successfully (faster-whisper on {device})")
+        return model
+
     @property
     def device(self) -> str:
         """Get the device the model is running on."""
@@ -89,7 +246,7 @@ class WhisperModelService:
     @property
     def is_loaded(self) -> bool:
         """Check if model is loaded."""
-        return self._initialized and self._pipeline is not None
+        return self._pipeline is not None
 
     def transcribe(
         self,
@@ -108,18 +265,85 @@ class WhisperModelService:
 
         logger.info(f"Transcribing: {audio_path}")
 
-        result = self._pipeline(
-            str(audio_path),
+        # concurrent callers in this process are batched into one pipeline call
+        text = self.submit(audio_path).result()
+        logger.info(f"Transcription complete: {len(text)} characters")
+
+        return text
+
+    def submit(self, audio_path: str | Path) -> Future:
+        """Queue an audio file for the next batch without waiting.
+
+        Args:
+            audio_path: Path to the audio file
+
+        Returns:
+            Future resolving to the transcribed text (or raising the error)
+        """
+        return self._batcher.submit(str(audio_path))
+
+    def _transcribe_batch(self, audio_paths: list[str]) -> list[str]:
+        """Run the pipeline once over a batch of audio files."""
+        if self._settings.whisper_backend == "faster-whisper":
+            # no cross-file batching in faster-whisper, run files back to back
+            return [self._transcribe_faster_whisper(path) for path in audio_paths]
+
+        # chunked inference pads every window to chunk_length_s, so files of
+        # different durations batch together without extra padding
+        # the pipeline consumes a generator lazily, so decoded audio is pulled as needed
+        inputs = self._decode_ahead(audio_paths) if self._decoder else audio_paths
+        results = self._pipeline(
+            inputs,
+            batch_size=len(audio_paths),
+            # no dataloader worker processes, forking fails in daemonic celery workers
+            num_workers=0,
             chunk_length_s=self._settings.whisper_chunk_length_s,
             stride_length_s=self._settings.whisper_stride_length_s,
         )
+        return [result.get("text", "").strip() for result in results]
 
-        text = result.get("text", "").strip()
-        logger.info(f"Transcription complete: {len(text)} characters")
+    def _decode_ahead(self, audio_paths: list[str]) -> Iterator[dict[str, Any]]:
+        """Yield decoded audio, keeping up to two files decoding in the background.
 
-        return text
+        Decoding (ffmpeg) overlaps with inference on the files already yielded.
+        Overlap is between files only, a single-file batch decodes then runs as before.
+        A decode error is raised when its file is reached.
+        """
+        sampling_rate = self._pipeline.feature_extractor.sampling_rate
+        pending_paths = iter(audio_paths)
+        pending: deque[Future] = deque()
+
+        def decode(path: str) -> dict[str, Any]:
+            raw = ffmpeg_read(Path(path).read_bytes(), sampling_rate)
+            return {"raw": raw, "sampling_rate": sampling_rate}
+
+        def refill() -> None:
+            while len(pending) < 2:
+                path = next(pending_paths, None)
+                if path is None:
+                    return
+                pending.append(self._decoder.submit(decode, path))
+
+        refill()
+        while pending:
+            decoded = pending.popleft().result()
+            refill()
+            yield decoded
+
+    def _transcribe_faster_whisper(self, audio_path: str) -> str:
+        """Transcribe one file with faster-whisper, joining its segments."""
+        segments, _ = self._pipeline.transcribe(
+            audio_path,
+            chunk_length=self._settings.whisper_chunk_length_s,
+            vad_filter=False,
+        )
+        # segments is a lazy generator, decoding happens while joining
+        return " ".join(segment.text.strip() for segment in segments).strip()
 
 
+# first call loads the model, later calls are a cache hit
+# startup (lifespan, worker_process_init) makes that first call before any concurrency
+@lru_cache(maxsize=1)
 def get_whisper_service() -> WhisperModelService:
-    """Get Whisper model service singleton instance."""
+    """Get the per-process Whisper model service."""
     return WhisperModelService()
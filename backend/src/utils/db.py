@@ -2,40 +2,158 @@
 
 import logging
 from collections.abc import Generator
-from datetime import datetime
+from datetime import datetime, timezone
+from functools import lru_cache
 from pathlib import Path
-from typing import Sequence
+from typing import Any, Sequence
 
-from sqlalchemy import DateTime, Integer, String, Text, create_engine, select
+from sqlalchemy import (Connection, DateTime, Engine, Index, Integer, Row,
+                        String, Text, TypeDecorator, create_engine, event,
+                        func, insert, inspect, lambda_stmt, make_url, select,
+                        text, update)
 from sqlalchemy.orm import (DeclarativeBase, Mapped, Session, mapped_column,
                             sessionmaker)
 
 from src.utils.settings import get_settings
 
 logger = logging.getLogger(__name__)
-settings = get_settings()
 
 # --- Engine & Session ---
 
-engine = create_engine(
-    settings.database_url,
-    connect_args={"check_same_thread": False},  # Required for SQLite
-    echo=settings.debug,
-)
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# warm connections kept per process, pragmas only run when one is first opened
+POOL_SIZE = 8
+POOL_MAX_OVERFLOW = 8
+
+
+def _pool_kwargs(database_url: str) -> dict[str, int]:
+    """QueuePool sizing for file-backed databases, none for in-memory SQLite.
+
+    In-memory SQLite urls get SingletonThreadPool/StaticPool, which reject
+    pool_size and max_overflow.
+    """
+    url = make_url(database_url)
+    if url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    ):
+        return {}
+    return {"pool_size": POOL_SIZE, "max_overflow": POOL_MAX_OVERFLOW}
+
+
+# built on first use, not at import, so importers don't pay for it
+@lru_cache(maxsize=1)
+def get_engine() -> Engine:
+    """Get the cached database engine."""
+    settings = get_settings()
+    engine = create_engine(
+        settings.database_url,
+        connect_args={"check_same_thread": False},  # Required for SQLite
+        # sessions are per request but connections stay warm in the pool
+        **_pool_kwargs(settings.database_url),
+    )
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _set_sqlite_pragmas)
+    # instead of echo=, so non-debug runs have no statement logging hooks at all
+    if settings.debug:
+        event.listen(engine, "before_cursor_execute", _log_statement)
+    return engine
+
+
+def _log_statement(
+    _conn: Any,
+    _cursor: Any,
+    statement: str,
+    _parameters: Any,
+    _context: Any,
+    _executemany: bool,
+) -> None:
+    """Log each SQL statement in debug mode, without formatting its parameters."""
+    logger.debug(f"SQL: {statement}")
+
+
+def _set_sqlite_pragmas(dbapi_connection: Any, _connection_record: Any) -> None:
+    """Tune each new SQLite connection for many small status-update commits."""
+    cursor = dbapi_connection.cursor()
+    # readers don't block the writer, commits append to the wal instead of rewriting pages
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # fsync at checkpoints only, still safe against app crashes in wal mode
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute("PRAGMA mmap_size=268435456")  # 256MB
+    cursor.execute("PRAGMA cache_size=-65536")  # 64MB, negative is KiB
+    cursor.close()
+
+
+# bump when models change, init_db brings older database files up to date
+# 1: initial table, 2: content_hash + list indexes, 3: created_timestamp server default
+SCHEMA_VERSION = 3
+
+# unbound, pass bind=get_engine() when opening a session
+SessionLocal = sessionmaker(autocommit=False, autoflush=False)
 
 
 def init_db() -> None:
-    """Initialize database and create tables."""
-    db_path = settings.database_url.replace("sqlite:///", "")
+    """Initialize database and create tables.
+
+    Schema work only runs when the file's PRAGMA user_version is behind SCHEMA_VERSION,
+    so a normal boot is one pragma read instead of introspecting every table.
+    """
+    engine = get_engine()
+    db_path = get_settings().database_url.replace("sqlite:///", "")
     Path(db_path).parent.mkdir(parents=True, exist_ok=True)
-    Base.metadata.create_all(bind=engine)
+
+    with engine.begin() as conn:
+        version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+        if version >= SCHEMA_VERSION:
+            return
+
+        if inspect(conn).has_table("transcriptions"):
+            _migrate_transcriptions(conn)
+        Base.metadata.create_all(bind=conn)
+
+        for index in Transcription.__table__.indexes:
+            index.create(conn, checkfirst=True)
+
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        logger.info(f"Database schema at version {SCHEMA_VERSION}")
+
+
+def _migrate_transcriptions(conn: Connection) -> None:
+    """Bring a transcriptions table created by an older release up to the current model."""
+    columns = {col["name"]: col for col in inspect(conn).get_columns("transcriptions")}
+    if "content_hash" not in columns:
+        conn.execute(
+            text("ALTER TABLE transcriptions ADD COLUMN content_hash VARCHAR(64)")
+        )
+
+    # sqlite can't change a column default in place, rebuild the table and copy rows over
+    if columns["created_timestamp"]["default"] is None:
+        conn.exec_driver_sql("ALTER TABLE transcriptions RENAME TO transcriptions_old")
+        for index in inspect(conn).get_indexes("transcriptions_old"):
+            conn.exec_driver_sql(f'DROP INDEX "{index["name"]}"')
+        Transcription.__table__.create(conn)
+        names = [col.name for col in Transcription.__table__.columns]
+        # old rows hold naive local time, CURRENT_TIMESTAMP is utc; convert so both
+        # sort on one clock, keeping the fractional seconds after position 19
+        values = [
+            (
+                "strftime('%Y-%m-%d %H:%M:%S', created_timestamp, 'utc')"
+                " || substr(created_timestamp, 20)"
+                if name == "created_timestamp"
+                else name
+            )
+            for name in names
+        ]
+        conn.exec_driver_sql(
+            f"INSERT INTO transcriptions ({', '.join(names)}) "
+            f"SELECT {', '.join(values)} FROM transcriptions_old"
+        )
+        conn.exec_driver_sql("DROP TABLE transcriptions_old")
+        logger.info("Rebuilt transcriptions table with server-side created_timestamp")
 
 
 def get_db() -> Generator[Session, None, None]:
     """Dependency to get database session."""
-    db = SessionLocal()
+    db = SessionLocal(bind=get_engine())
     try:
         yield db
     finally:
@@ -45,6 +163,29 @@ def get_db() -> Generator[Session, None, None]:
 # --- Models ---
 
 
+class UTCDateTime(TypeDecorator):
+    """DATETIME stored as naive UTC, read back as timezone-aware UTC.
+
+    SQLite keeps no offset, without one the API would serialize "2024-01-01T10:00:00"
+    and clients would read it as their local time.
+    """
+
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value: datetime | None, dialect: Any) -> Any:
+        """Store aware datetimes as naive UTC, like CURRENT_TIMESTAMP writes."""
+        if value is not None and value.tzinfo is not None:
+            value = value.astimezone(timezone.utc).replace(tzinfo=None)
+        return value
+
+    def process_result_value(self, value: datetime | None, dialect: Any) -> Any:
+        """Attach UTC so responses carry the +00:00 offset."""
+        if value is not None:
+            value = value.replace(tzinfo=timezone.utc)
+        return value
+
+
 class Base(DeclarativeBase):
     """Base class for SQLAlchemy models."""
 
@@ -55,6 +196,10 @@ class Transcription(Base):
     """Transcription database model."""
 
     __tablename__ = "transcriptions"
+    # status filter + newest first is one index range scan, sqlite walks it backwards for DESC
+    __table_args__ = (
+        Index("ix_transcriptions_status_created", "status", "created_timestamp"),
+    )
     # file name, must be unique
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)  # PK
     audio_filename: Mapped[str] = mapped_column(
@@ -62,8 +207,13 @@ class Transcription(Base):
     )
     # nullable until transcription completes
     transcribed_text: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # list endpoints order by this, index avoids a full scan + sort
+    # filled in by sqlite on insert (utc, second resolution), id breaks ties
     created_timestamp: Mapped[datetime] = mapped_column(
-        DateTime, default=datetime.now, nullable=False
+        UTCDateTime,
+        server_default=func.current_timestamp(),
+        nullable=False,
+        index=True,
     )
     # processing, completed, failed
     status: Mapped[str] = mapped_column(
@@ -73,6 +223,11 @@ class Transcription(Base):
     task_id: Mapped[str | None] = mapped_column(String(255), nullable=True, index=True)
     # error details if failed
     error_message: Mapped[str | None] = mapped_column(Text, nullable=True)
+    # sha-256 of the audio, same bytes uploaded again reuse a completed transcription
+    # not unique, every upload still gets its own row
+    content_hash: Mapped[str | None] = mapped_column(
+        String(64), nullable=True, index=True
+    )
 
     # for readable string and formatting when logging
     def __repr__(self) -> str:
@@ -83,6 +238,10 @@ class Transcription(Base):
         )
 
 
+# ORM bulk UPDATE by primary key (executemany), built once so its cache key is memoized
+_UPDATE_BY_PK = update(Transcription)
+
+
 # CRUD
 class TranscriptionRepository:
     """Repository for transcription CRUD operations."""
@@ -111,16 +270,107 @@ class TranscriptionRepository:
         logger.info(f"Created transcription: {transcription.id} with status: {status}")
         return transcription
 
+    def create_many(self, rows: Sequence[dict[str, Any]]) -> list[int]:
+        """Insert transcription rows in one executemany INSERT + commit, returning IDs in order."""
+        if not rows:
+            return []
+
+        stmt = insert(Transcription).returning(
+            Transcription.id, sort_by_parameter_order=True
+        )
+        ids = list(self._db.scalars(stmt, rows))
+        self._db.commit()
+        logger.info(f"Created {len(ids)} transcriptions")
+        return ids
+
+    def bulk_create(
+        self,
+        audio_filenames: Sequence[str],
+        status: str = "processing",
+        content_hashes: Sequence[str | None] | None = None,
+        task_ids: Sequence[str | None] | None = None,
+    ) -> list[int]:
+        """Create transcription records for a batch upload, returning their IDs in order."""
+        if content_hashes is None:
+            content_hashes = [None] * len(audio_filenames)
+        if task_ids is None:
+            task_ids = [None] * len(audio_filenames)
+
+        return self.create_many(
+            [
+                {
+                    "audio_filename": name,
+                    "status": status,
+                    "content_hash": h,
+                    "task_id": task_id,
+                }
+                for name, h, task_id in zip(audio_filenames, content_hashes, task_ids)
+            ]
+        )
+
     def get_all(self, skip: int = 0, limit: int = 100) -> Sequence[Transcription]:
         """Get all transcriptions, ordered by most recent first."""
         stmt = (
             select(Transcription)
-            .order_by(Transcription.created_timestamp.desc())
+            .order_by(Transcription.created_timestamp.desc(), Transcription.id.desc())
             .offset(skip)
             .limit(limit)
         )
         return self._db.execute(stmt).scalars().all()
 
+    def get_rows(
+        self, skip: int = 0, limit: int = 100, status: str | None = None
+    ) -> list[dict]:
+        """Get transcriptions as plain dicts, most recent first, without ORM hydration."""
+        return self._select_rows(
+            (
+                Transcription.id,
+                Transcription.audio_filename,
+                Transcription.transcribed_text,
+                Transcription.created_timestamp,
+                Transcription.status,
+                Transcription.task_id,
+                Transcription.error_message,
+            ),
+            skip,
+            limit,
+            status,
+        )
+
+    def list_rows(
+        self, skip: int = 0, limit: int = 100, status: str | None = None
+    ) -> list[dict]:
+        """Get id, filename, timestamp and status only, leaving the text blobs in sqlite."""
+        return self._select_rows(
+            (
+                Transcription.id,
+                Transcription.audio_filename,
+                Transcription.created_timestamp,
+                Transcription.status,
+            ),
+            skip,
+            limit,
+            status,
+        )
+
+    def _select_rows(
+        self,
+        columns: Sequence[Any],
+        skip: int,
+        limit: int,
+        status: str | None,
+    ) -> list[dict]:
+        """Select the given columns newest first, optionally filtered by status."""
+        stmt = (
+            select(*columns)
+            .order_by(Transcription.created_timestamp.desc(), Transcription.id.desc())
+            .offset(skip)
+            .limit(limit)
+        )
+        if status:
+            stmt = stmt.where(Transcription.status == status)
+        return [dict(row) for row in self._db.execute(stmt).mappings()]
+
     def get_by_id(self, transcription_id: int) -> Transcription | None:
         """Get transcription by ID."""
         stmt = select(Transcription).where(Transcription.id == transcription_id)
@@ -133,7 +383,7 @@ class TranscriptionRepository:
         stmt = (
             select(Transcription)
             .where(Transcription.status == status)
-            .order_by(Transcription.created_timestamp.desc())
+            .order_by(Transcription.created_timestamp.desc(), Transcription.id.desc())
             .offset(skip)
             .limit(limit)
         )
@@ -144,46 +394,113 @@ class TranscriptionRepository:
         stmt = select(Transcription).where(Transcription.task_id == task_id)
         return self._db.execute(stmt).scalar_one_or_none()
 
+    def get_status_bundle(self, task_id: str) -> Row | None:
+        """Get only the columns status polling needs (id, text, error, status) by task ID."""
+        # polled every few seconds per upload, a lambda_stmt skips rebuilding the
+        # select and its cache key on each call, task_id becomes a bound param
+        stmt = lambda_stmt(
+            lambda: select(
+                Transcription.id,
+                Transcription.transcribed_text,
+                Transcription.error_message,
+                Transcription.status,
+            ).where(Transcription.task_id == task_id)
+        )
+        return self._db.execute(stmt).first()
+
+    def get_completed_texts(self, content_hashes: Sequence[str]) -> dict[str, str]:
+        """Get transcribed text of completed transcriptions by content hash."""
+        if not content_hashes:
+            return {}
+
+        stmt = select(Transcription.content_hash, Transcription.transcribed_text).where(
+            Transcription.content_hash.in_(set(content_hashes)),
+            Transcription.status == "completed",
+        )
+        return {h: transcribed for h, transcribed in self._db.execute(stmt)}
+
     # the file name all start with sample, so index won't help much
     def search_by_filename(self, filename_query: str) -> Sequence[Transcription]:
         """Search transcriptions by filename (partial match)."""
         stmt = (
             select(Transcription)
             .where(Transcription.audio_filename.contains(filename_query))
-            .order_by(Transcription.created_timestamp.desc())
+            .order_by(Transcription.created_timestamp.desc(), Transcription.id.desc())
         )
         return self._db.execute(stmt).scalars().all()
 
+    def finalize(
+        self,
+        transcription_id: int,
+        status: str,
+        text: str | None = None,
+        error: str | None = None,
+    ) -> None:
+        """Set final status, text and error in one UPDATE + commit, no SELECT."""
+        # runs once per task, the lambda caches the statement and its key, the
+        # closure values become bound params
+        stmt = lambda_stmt(
+            lambda: update(Transcription)
+            .where(Transcription.id == transcription_id)
+            .values(transcribed_text=text, status=status, error_message=error)
+        )
+        self._db.execute(stmt)
+        self._db.commit()
+        logger.info(f"Finalized transcription {transcription_id} with status: {status}")
+
+    def update(self, transcription_id: int, **fields: Any) -> None:
+        """Set the given columns on one transcription in a single UPDATE + commit, no SELECT."""
+        stmt = (
+            update(Transcription)
+            .where(Transcription.id == transcription_id)
+            .values(**fields)
+        )
+        self._db.execute(stmt)
+        self._db.commit()
+
     def update_transcription_text(self, transcription_id: int, text: str) -> None:
         """Update transcribed text."""
-        transcription = self.get_by_id(transcription_id)
-        if transcription:
-            transcription.transcribed_text = text
-            self._db.commit()
-            logger.info(f"Updated transcription {transcription_id} with text")
+        self.update(transcription_id, transcribed_text=text)
+        logger.info(f"Updated transcription {transcription_id} with text")
 
     def update_transcription_status(self, transcription_id: int, status: str) -> None:
         """Update transcription status (processing, completed, failed)."""
-        transcription = self.get_by_id(transcription_id)
-        if transcription:
-            transcription.status = status
-            self._db.commit()
-            logger.info(f"Updated transcription {transcription_id} status to: {status}")
+        self.update(transcription_id, status=status)
+        logger.info(f"Updated transcription {transcription_id} status to: {status}")
 
     def update_transcription_error(self, transcription_id: int, error: str) -> None:
         """Update error message."""
-        transcription = self.get_by_id(transcription_id)
-        if transcription:
-            transcription.error_message = error
-            self._db.commit()
-            logger.info(f"Updated transcription {transcription_id} with error")
+        self.update(transcription_id, error_message=error)
+        logger.info(f"Updated transcription {transcription_id} with error")
 
     def update_task_id(self, transcription_id: int, task_id: str) -> None:
         """Update Celery task ID."""
-        transcription = self.get_by_id(transcription_id)
-        if transcription:
-            transcription.task_id = task_id
-            self._db.commit()
-            logger.info(
-                f"Updated transcription {transcription_id} with task_id: {task_id}"
-            )
+        self.update(transcription_id, task_id=task_id)
+        logger.info(f"Updated transcription {transcription_id} with task_id: {task_id}")
+
+    def bulk_update_task_ids(self, task_ids: dict[int, str]) -> None:
+        """Update Celery task IDs for many transcriptions in one UPDATE + commit."""
+        if not task_ids:
+            return
+
+        self._db.execute(
+            _UPDATE_BY_PK,
+            [{"id": tid, "task_id": task_id} for tid, task_id in task_ids.items()],
+        )
+        self._db.commit()
+        logger.info(f"Updated {len(task_ids)} transcriptions with task_ids")
+
+    def bulk_fail(self, transcription_ids: Sequence[int], error: str) -> None:
+        """Mark many transcriptions failed with the same error in one UPDATE + commit."""
+        if not transcription_ids:
+            return
+
+        self._db.execute(
+            _UPDATE_BY_PK,
+            [
+                {"id": tid, "status": "failed", "error_message": error}
+                for tid in transcription_ids
+            ],
+        )
+        self._db.commit()
+        logger.info(f"Marked {len(transcription_ids)} transcriptions failed: {error}")
@@ -2,7 +2,7 @@
 
 from datetime import datetime
 
-from pydantic import BaseModel, ConfigDict, Field
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter
 
 
 class HealthResponse(BaseModel):
@@ -32,6 +32,19 @@ class TranscriptionResponse(BaseModel):
     error_message: str | None = None
 
 
+class TranscriptionListItem(BaseModel):
+    """Transcription list entry without the transcribed text."""
+
+    id: int
+    audio_filename: str
+    created_timestamp: datetime
+    status: str
+
+
+# validates a whole list of ORM rows in one pydantic-core pass
+TRANSCRIPTION_LIST_ADAPTER = TypeAdapter(list[TranscriptionResponse])
+
+
 class TranscriptionTaskResponse(BaseModel):
     """Response for async transcription task."""
 
@@ -1,6 +1,10 @@
 """Security utilities."""
 
-import re2 as re  # use google re2 not normal re
+# SQL/HTML/path travelsal injection chars, stripped with one C-level translate pass
+# all ascii, so deleting them from utf-8 bytes never splits a multi-byte char
+_BAD_BYTES = b"<>\"';(){}\\"
+# only the first 255 chars survive, cap the work on huge inputs before translating
+_MAX_RAW_QUERY_LENGTH = 1024
 
 
 def sanitize_search_query(query: str) -> str:
@@ -12,7 +16,7 @@ def sanitize_search_query(query: str) -> str:
     Returns:
         Sanitized query string (max 255 characters, dangerous chars removed)
     """
-    # SQL/HTML/path travelsal injection
-    sanitized = re.sub(r"[<>\"';(){}\\]", "", query)
-    sanitized = sanitized.strip()[:255]
-    return sanitized
+    # bytes.translate is a flat table lookup, ~3x faster than str.translate's mapping path
+    raw = query[:_MAX_RAW_QUERY_LENGTH].encode("utf-8", "surrogatepass")
+    cleaned = raw.translate(None, _BAD_BYTES).decode("utf-8", "surrogatepass")
+    return cleaned.strip()[:255]
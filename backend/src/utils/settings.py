@@ -1,6 +1,7 @@
 """Application settings and configuration helpers."""
 
 import os
+from functools import lru_cache
 from pathlib import Path
 
 from dotenv import load_dotenv
@@ -24,6 +25,9 @@ class Settings:
         # Storage
         self.upload_dir = Path(os.getenv("UPLOAD_DIR", "./uploads"))
         self.model_cache_dir = Path(os.getenv("MODEL_CACHE_DIR", "./model_cache"))
+        # ensured once at config time, not on each load/save path
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.model_cache_dir.mkdir(parents=True, exist_ok=True)
 
         # avg kbps = 125kbps
         # minutes = (max_size_mb * 8_000_000) / (avg_kbps * 1000 * 60)
@@ -32,8 +36,34 @@ class Settings:
 
         # Whisper Model
         self.whisper_model_name = os.getenv("WHISPER_MODEL_NAME", "openai/whisper-tiny")
+        # transformers (hf pipeline) or faster-whisper (ctranslate2, int8 on cpu)
+        self.whisper_backend = os.getenv("WHISPER_BACKEND", "transformers")
         self.whisper_chunk_length_s = int(os.getenv("WHISPER_CHUNK_LENGTH_S", "30"))
         self.whisper_stride_length_s = (4, 4)
+        # decode upcoming files on a background thread, overlapping it with inference.
+        # only helps batches of several files (inference stream worker), a prefork
+        # celery task is one file per batch so there is nothing to overlap
+        self.whisper_prefetch_audio = (
+            os.getenv("WHISPER_PREFETCH_AUDIO", "false").lower() == "true"
+        )
+        # send transcriptions to the shared inference worker (redis stream) instead of
+        # loading a model in every celery worker process
+        self.whisper_inference_stream = (
+            os.getenv("WHISPER_INFERENCE_STREAM", "false").lower() == "true"
+        )
+        # cpu only, torch intra-op threads per process, 0 = half the cores
+        self.torch_num_threads = int(os.getenv("TORCH_NUM_THREADS", "0"))
+        # cuda only, compiles the encoder into cuda graphs at startup
+        self.whisper_torch_compile = (
+            os.getenv("WHISPER_TORCH_COMPILE", "true").lower() == "true"
+        )
+        # concurrent requests wait up to this long to share one batched pipeline call.
+        # 0 = only batch what is already queued, a prefork celery worker only ever has
+        # one request in flight so any wait is pure latency
+        self.whisper_batch_max_wait_ms = int(
+            os.getenv("WHISPER_BATCH_MAX_WAIT_MS", "0")
+        )
+        self.whisper_max_batch_size = int(os.getenv("WHISPER_MAX_BATCH_SIZE", "8"))
 
         # fe
         self.cors_origins = os.getenv("CORS_ORIGINS", "http://localhost:3000")
@@ -60,13 +90,8 @@ class Settings:
         return [origin.strip() for origin in self.cors_origins.split(",")]
 
 
-# module-level cache + singleton, first caller from any importer init it and later call reuse
-_settings = None
-
-
-def get_settings():
+# cached singleton, first caller from any importer init it and later call reuse
+@lru_cache(maxsize=1)
+def get_settings() -> Settings:
     """Get cached settings instance."""
-    global _settings
-    if _settings is None:
-        _settings = Settings()
-    return _settings
+    return Settings()
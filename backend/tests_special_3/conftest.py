@@ -1,17 +1,18 @@
 """Shared pytest fixtures for tests_special_3."""
 
-import shutil
-import tempfile
-from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
+import httpx
 import pytest
+import pytest_asyncio
 from fastapi.testclient import TestClient
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
 from sqlalchemy.pool import StaticPool
 
 from src.services.file_service import FileService, get_file_service
-from src.utils.db import Base, get_db
+from src.utils.db import Base, TranscriptionRepository, get_db
+from src.utils.settings import get_settings
 
 # Test database - use StaticPool for in-memory sqlite thread safety
 SQLALCHEMY_DATABASE_URL = "sqlite:///:memory:"
@@ -20,37 +21,95 @@ engine = create_engine(
     connect_args={"check_same_thread": False, "timeout": 30},
     poolclass=StaticPool,
 )
-TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 
-@pytest.fixture(scope="function")
-def test_db():
-    """Create test database for each test function."""
+# pysqlite defers BEGIN and breaks SAVEPOINT, let sqlalchemy emit BEGIN itself
+@event.listens_for(engine, "connect")
+def _disable_pysqlite_begin(dbapi_connection, _connection_record):
+    dbapi_connection.isolation_level = None
+
+
+@event.listens_for(engine, "begin")
+def _emit_begin(conn):
+    conn.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture(scope="session")
+def db_connection():
+    """Create the schema once per test run and share one connection."""
     Base.metadata.create_all(bind=engine)
-    db = TestingSessionLocal()
+    connection = engine.connect()
+    try:
+        yield connection
+    finally:
+        connection.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture(scope="function")
+def test_db(db_connection):
+    """Per-test session, everything it (or the app) commits is rolled back afterwards."""
+    transaction = db_connection.begin()
+    # commits inside the test release a savepoint instead of ending the outer transaction
+    db = Session(bind=db_connection, join_transaction_mode="create_savepoint")
     try:
         yield db
     finally:
         db.close()
-        Base.metadata.drop_all(bind=engine)
+        transaction.rollback()
+
+
+@pytest.fixture(scope="function")
+def repo(test_db):
+    """Transcription repository on the test session."""
+    return TranscriptionRepository(test_db)
+
+
+@pytest.fixture(scope="session")
+def upload_executor():
+    """Thread pool for the filename thread-safety test, threads are spawned once per run."""
+    executor = ThreadPoolExecutor(max_workers=20)
+    yield executor
+    executor.shutdown()
 
 
 @pytest.fixture(scope="function")
-def temp_upload_dir():
-    """Create temporary upload directory."""
-    temp_dir = tempfile.mkdtemp()
-    yield Path(temp_dir)
-    shutil.rmtree(temp_dir, ignore_errors=True)
+def temp_upload_dir(tmp_path):
+    """Create temporary upload directory, unique per test (and per xdist worker)."""
+    upload_dir = tmp_path / "uploads"
+    upload_dir.mkdir()
+    return upload_dir
 
 
 @pytest.fixture(scope="function")
-def test_client(test_db, temp_upload_dir):
+def file_service(temp_upload_dir):
+    """File service writing into the temp upload directory."""
+    service = FileService()
+    service._upload_dir = temp_upload_dir
+    return service
+
+
+@pytest.fixture(scope="session")
+def app_client():
+    """Client with the app lifespan (init_db, whisper load) entered once per run."""
+    from src.main import app
+
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="function")
+def test_client(app_client, test_db, file_service):
     """Create test client with mocked dependencies."""
 
-    from src.main import app, limiter
+    from src.main import _health_cache, app, limiter
+
+    # snapshot so teardown puts back exactly what was there, even if a test fails midway
+    original_overrides = dict(app.dependency_overrides)
 
+    # request sessions join the test's transaction so the test can see their commits
     def override_get_db():
-        db = TestingSessionLocal()
+        db = Session(bind=test_db.bind, join_transaction_mode="create_savepoint")
         try:
             yield db
         finally:
@@ -58,12 +117,9 @@ def test_client(test_db, temp_upload_dir):
 
     app.dependency_overrides[get_db] = override_get_db
 
-    # Mock file service to use temp directory
-    mock_file_service = FileService()
-    mock_file_service._upload_dir = temp_upload_dir
-
+    # file service writes to the temp directory
     def override_get_file_service():
-        return mock_file_service
+        return file_service
 
     app.dependency_overrides[get_file_service] = override_get_file_service
 
@@ -71,15 +127,31 @@ def test_client(test_db, temp_upload_dir):
     original_enabled = limiter.enabled
     limiter.enabled = False
 
-    with TestClient(app) as client:
-        yield client
+    # health sub-checks are cached, each test mocks its own deps
+    _health_cache.clear()
+
+    # the client is shared, only the overrides and limiter state are per test
+    yield app_client
 
     # restore original state
     limiter.enabled = original_enabled
     app.dependency_overrides.clear()
+    app.dependency_overrides.update(original_overrides)
+
+
+@pytest_asyncio.fixture
+async def async_client(test_client):
+    """Async client on the app test_client has set up, for asyncio.gather bursts."""
+    from src.main import app
+
+    # overrides, limiter and lifespan come from test_client, requests share one loop
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        yield client
 
 
-@pytest.fixture
+# payloads are immutable bytes, build them once per run
+@pytest.fixture(scope="session")
 def sample_mp3_bytes():
     """Create valid MP3 file bytes."""
     mp3_header = b"ID3\x04\x00\x00\x00\x00\x00\x00"
@@ -87,16 +159,15 @@ def sample_mp3_bytes():
     return mp3_header + mp3_data
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def large_mp3_bytes():
-    """Create oversized MP3 file bytes (exceeds 15MB limit)."""
+    """Create oversized MP3 file bytes (1KB over the upload size limit)."""
     mp3_header = b"ID3\x04\x00\x00\x00\x00\x00\x00"
-    # Create ~20MB file
-    mp3_data = b"\xff\xfb\x90\x00" * (5 * 1024 * 1024)
+    mp3_data = b"\xff\xfb\x90\x00" * (get_settings().max_upload_size_bytes // 4 + 256)
     return mp3_header + mp3_data
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def invalid_file_bytes():
     """Create non-MP3 file bytes (exe file)."""
     return b"MZ" + b"\x00" * 2046  # PE/exe header
@@ -6,278 +6,175 @@ exercises full lifecycle: pending → processing → completed
 catches issues unit tests miss: db session lifecycle in background tasks
 """
 
-from unittest.mock import MagicMock, patch
-
+import msgpack
 import pytest
+from celery.exceptions import Retry
 
-from src.utils.db import TranscriptionRepository
+from src.services import celery_app
+from src.services.celery_app import (MAX_WORKER_LOSSES, RETRY_BASE_DELAY_S,
+                                     RETRY_MAX_DELAY_S, get_task_meta,
+                                     next_retry_delay, transcribe_audio_task)
 
 
-class TestCeleryTaskEndToEnd:
-    """end-to-end tests for transcribe_audio_task with real database."""
+class FakeWhisper:
+    """plain whisper service stand-in, transcribe returns (or raises) queued results."""
 
-    def test_transcribe_success_updates_db_status_to_completed(self, test_db):
-        """test happy path: task completes and updates db status to completed"""
-        # create initial db record
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="test_audio.mp3", transcribed_text=None, status="processing"
-        )
-        transcription_id = transcription.id
-
-        # mock whisper service to return known text
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.return_value = "hello world transcription"
-
-        # mock get_db to return our test session
-        def mock_get_db():
-            yield test_db
-
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
-
-                # mock update_state to avoid task_id requirement when running directly
-                with patch.object(transcribe_audio_task, "update_state"):
-                    result = transcribe_audio_task.run(
-                        file_path="/fake/path/test.mp3",
-                        transcription_id=transcription_id,
-                    )
-
-        # assert - verify db was updated
-        updated = repo.get_by_id(transcription_id)
-        assert updated.status == "completed"
-        assert updated.transcribed_text == "hello world transcription"
-        assert result["status"] == "completed"
-        assert result["text"] == "hello world transcription"
+    def __init__(self) -> None:
+        self.results: list[str | Exception] = []
 
-    def test_transcribe_updates_state_to_processing(self, test_db):
-        """test that task updates state during processing"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="test_audio_2.mp3",
-            transcribed_text=None,
-            status="processing",
-        )
-        transcription_id = transcription.id  # save id before session operations
-
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.return_value = "transcribed text"
-
-        def mock_get_db():
-            yield test_db
-
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
-
-                # mock update_state to avoid task_id requirement
-                with patch.object(transcribe_audio_task, "update_state") as mock_update:
-                    result = transcribe_audio_task.run(
-                        file_path="/fake/path.mp3", transcription_id=transcription_id
-                    )
-                    # verify update_state was called with PROCESSING state
-                    assert mock_update.called
-                    mock_update.assert_any_call(
-                        state="PROCESSING", meta={"status": "Transcribing audio"}
-                    )
+    def transcribe(self, audio_path: str) -> str:
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
 
-        # verify task completed successfully
-        assert result["status"] == "completed"
 
-    def test_transcribe_failure_updates_db_to_failed(self, test_db):
-        """test that whisper failure updates db status to failed"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="test_fail.mp3", transcribed_text=None, status="processing"
-        )
-        transcription_id = transcription.id
+@pytest.fixture
+def fake_whisper():
+    """whisper service stand-in, each test queues its transcribe results."""
+    return FakeWhisper()
 
-        # mock whisper to raise exception
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.side_effect = Exception("whisper model error")
 
-        def mock_get_db():
-            yield test_db
+@pytest.fixture
+def make_transcriptions(repo):
+    """insert processing rows in one INSERT + commit, returns their ids in order."""
 
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
+    def _make(*audio_filenames: str) -> list[int]:
+        return repo.bulk_create(audio_filenames)
 
-                with patch.object(transcribe_audio_task, "update_state"):
-                    with pytest.raises(Exception, match="whisper model error"):
-                        transcribe_audio_task.run(
-                            file_path="/fake/path.mp3",
-                            transcription_id=transcription_id,
-                        )
+    return _make
 
-        # verify db was updated to failed with error message
-        updated = repo.get_by_id(transcription_id)
-        assert updated.status == "failed"
-        assert "whisper model error" in updated.error_message
 
-    def test_transcribe_file_not_found_sets_error(self, test_db):
-        """test that file not found error is captured in db"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="missing.mp3", transcribed_text=None, status="processing"
-        )
-        transcription_id = transcription.id  # save id before session operations
+@pytest.fixture(autouse=True)
+def task_deps(monkeypatch, test_db, fake_whisper):
+    """point the task at the fake whisper service and our test session."""
+    monkeypatch.setattr(
+        "src.services.celery_app.get_whisper_service", lambda: fake_whisper
+    )
+    # task opens its session from SessionLocal, hand it our test session
+    monkeypatch.setattr("src.services.celery_app.SessionLocal", lambda **_: test_db)
 
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.side_effect = FileNotFoundError("audio file not found")
 
-        def mock_get_db():
-            yield test_db
+@pytest.fixture(autouse=True)
+def deliveries(monkeypatch):
+    """in-memory delivery counter instead of redis, keyed like the real one."""
+    counts = {}
 
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
+    def count_delivery(task_id, attempt):
+        counts[(task_id, attempt)] = counts.get((task_id, attempt), 0) + 1
+        return counts[(task_id, attempt)]
 
-                with patch.object(transcribe_audio_task, "update_state"):
-                    with pytest.raises(FileNotFoundError):
-                        transcribe_audio_task.run(
-                            file_path="/nonexistent/path.mp3",
-                            transcription_id=transcription_id,
-                        )
+    monkeypatch.setattr(celery_app, "count_delivery", count_delivery)
+    monkeypatch.setattr(
+        celery_app,
+        "clear_deliveries",
+        lambda task_id, attempt: counts.pop((task_id, attempt), None),
+    )
+    return counts
 
-        updated = repo.get_by_id(transcription_id)
-        assert updated.status == "failed"
-        assert "not found" in updated.error_message.lower()
 
-    def test_transcribe_returns_correct_result_dict(self, test_db):
-        """test that task returns correctly formatted result dictionary"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="result_test.mp3", transcribed_text=None, status="processing"
-        )
-        transcription_id = transcription.id  # save id before session operations
-
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.return_value = "the transcribed text"
-
-        def mock_get_db():
-            yield test_db
-
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
-
-                with patch.object(transcribe_audio_task, "update_state"):
-                    result = transcribe_audio_task.run(
-                        file_path="/fake/path.mp3", transcription_id=transcription_id
-                    )
-
-        # verify result structure
-        assert isinstance(result, dict)
-        assert "status" in result
-        assert "transcription_id" in result
-        assert "text" in result
-        assert result["status"] == "completed"
-        assert result["transcription_id"] == transcription_id
-        assert result["text"] == "the transcribed text"
-
-    def test_transcribe_empty_text_still_completes(self, test_db):
-        """test that empty transcription (silence) still marks as completed"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="silence.mp3", transcribed_text=None, status="processing"
-        )
-        transcription_id = transcription.id  # save id before session operations
+@pytest.fixture(autouse=True)
+def task_states(monkeypatch):
+    """record update_state calls, a directly run task has no task_id to report to."""
+    states = []
+    monkeypatch.setattr(
+        transcribe_audio_task, "update_state", lambda **kwargs: states.append(kwargs)
+    )
+    return states
 
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.return_value = ""  # empty transcription
 
-        def mock_get_db():
-            yield test_db
+class TestCeleryTaskEndToEnd:
+    """end-to-end tests for transcribe_audio_task with real database."""
+
+    # happy path, silence and plain text all go through the same completed branch
+    @pytest.mark.parametrize(
+        "text",
+        ["hello world transcription", "", "the transcribed text"],
+        ids=["text", "empty", "plain"],
+    )
+    def test_transcribe_success_updates_db_to_completed(
+        self, repo, fake_whisper, make_transcriptions, text
+    ):
+        """test that a finished task stores text + completed status and returns the result dict"""
+        # create initial db record
+        (transcription_id,) = make_transcriptions("test_audio.mp3")
 
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
+        fake_whisper.results = [text]
 
-                with patch.object(transcribe_audio_task, "update_state"):
-                    result = transcribe_audio_task.run(
-                        file_path="/fake/path.mp3", transcription_id=transcription_id
-                    )
+        result = transcribe_audio_task.run(
+            file_path="/fake/path/test.mp3",
+            transcription_id=transcription_id,
+        )
 
+        # both text and status are updated
         updated = repo.get_by_id(transcription_id)
         assert updated.status == "completed"
-        assert updated.transcribed_text == ""
-        assert result["status"] == "completed"
+        assert updated.transcribed_text == text
+        assert result == {
+            "status": "completed",
+            "transcription_id": transcription_id,
+            "text": text,
+        }
+
+    def test_transcribe_updates_state_to_processing(
+        self, fake_whisper, make_transcriptions, task_states
+    ):
+        """test that task updates state during processing"""
+        (transcription_id,) = make_transcriptions("test_audio_2.mp3")
 
-    def test_db_updates_both_text_and_status(self, test_db):
-        """test that both text and status are updated in sequence"""
-        repo = TranscriptionRepository(test_db)
-        transcription = repo.create(
-            audio_filename="both_updates.mp3",
-            transcribed_text=None,
-            status="processing",
-        )
-        transcription_id = transcription.id  # save id before session operations
+        fake_whisper.results = ["transcribed text"]
 
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.return_value = "transcribed content"
+        result = transcribe_audio_task.run(
+            file_path="/fake/path.mp3", transcription_id=transcription_id
+        )
 
-        def mock_get_db():
-            yield test_db
+        # verify update_state was called with PROCESSING state
+        assert {
+            "state": "PROCESSING",
+            "meta": {"status": "Transcribing audio"},
+        } in task_states
 
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
+        # verify task completed successfully
+        assert result["status"] == "completed"
 
-                with patch.object(transcribe_audio_task, "update_state"):
-                    transcribe_audio_task.run(
-                        file_path="/fake/path.mp3", transcription_id=transcription_id
-                    )
+    @pytest.mark.parametrize(
+        "error,expected_message",
+        [
+            (Exception("whisper model error"), "whisper model error"),
+            (FileNotFoundError("audio file not found"), "not found"),
+        ],
+        ids=["whisper_error", "file_not_found"],
+    )
+    def test_transcribe_failure_updates_db_to_failed(
+        self, repo, fake_whisper, make_transcriptions, error, expected_message
+    ):
+        """test that a whisper error re-raises and is captured in db as failed"""
+        (transcription_id,) = make_transcriptions("test_fail.mp3")
+
+        fake_whisper.results = [error]
+
+        with pytest.raises(type(error), match=expected_message):
+            transcribe_audio_task.run(
+                file_path="/fake/path.mp3",
+                transcription_id=transcription_id,
+            )
 
+        # verify db was updated to failed with error message
         updated = repo.get_by_id(transcription_id)
-        # both should be updated
-        assert updated.transcribed_text == "transcribed content"
-        assert updated.status == "completed"
+        assert updated.status == "failed"
+        assert expected_message in updated.error_message.lower()
 
-    def test_multiple_sequential_tasks_isolated(self, test_db):
+    def test_multiple_sequential_tasks_isolated(
+        self, repo, fake_whisper, make_transcriptions
+    ):
         """test that multiple tasks don't interfere with each other"""
-        repo = TranscriptionRepository(test_db)
-
         # create two transcriptions
-        t1 = repo.create(audio_filename="task1.mp3", status="processing")
-        t1_id = t1.id  # save id before session operations
-        t2 = repo.create(audio_filename="task2.mp3", status="processing")
-        t2_id = t2.id  # save id before session operations
-
-        mock_whisper = MagicMock()
-        mock_whisper.transcribe.side_effect = ["text for task 1", "text for task 2"]
-
-        def mock_get_db():
-            yield test_db
-
-        with patch(
-            "src.services.celery_app.WhisperModelService", return_value=mock_whisper
-        ):
-            with patch("src.services.celery_app.get_db", mock_get_db):
-                from src.services.celery_app import transcribe_audio_task
-
-                with patch.object(transcribe_audio_task, "update_state"):
-                    transcribe_audio_task.run(
-                        file_path="/path/task1.mp3", transcription_id=t1_id
-                    )
-                    transcribe_audio_task.run(
-                        file_path="/path/task2.mp3", transcription_id=t2_id
-                    )
+        t1_id, t2_id = make_transcriptions("task1.mp3", "task2.mp3")
+
+        fake_whisper.results = ["text for task 1", "text for task 2"]
+
+        transcribe_audio_task.run(file_path="/path/task1.mp3", transcription_id=t1_id)
+        transcribe_audio_task.run(file_path="/path/task2.mp3", transcription_id=t2_id)
 
         # verify each task updated its own record
         updated1 = repo.get_by_id(t1_id)
@@ -287,3 +184,126 @@ class TestCeleryTaskEndToEnd:
         assert updated2.transcribed_text == "text for task 2"
         assert updated1.status == "completed"
         assert updated2.status == "completed"
+
+
+class TestWorkerLost:
+    """redeliveries after lost workers are bounded."""
+
+    def test_finished_task_clears_delivery_count(
+        self, fake_whisper, make_transcriptions, deliveries
+    ):
+        """test that a task that ran to the end leaves no delivery count behind"""
+        (transcription_id,) = make_transcriptions("ok.mp3")
+        fake_whisper.results = ["fine"]
+
+        transcribe_audio_task.run(
+            file_path="/ok.mp3", transcription_id=transcription_id
+        )
+
+        assert deliveries == {}
+
+    def test_poison_file_failed_after_max_worker_losses(
+        self, repo, fake_whisper, make_transcriptions, deliveries
+    ):
+        """test that a file that keeps killing workers is failed without running whisper"""
+        (transcription_id,) = make_transcriptions("poison.mp3")
+        fake_whisper.results = ["never returned"]
+        # earlier deliveries of this attempt each lost their worker, a directly
+        # run task has no id and retries=0
+        deliveries[(None, 0)] = MAX_WORKER_LOSSES
+
+        with pytest.raises(RuntimeError, match="Worker lost"):
+            transcribe_audio_task.run(
+                file_path="/poison.mp3", transcription_id=transcription_id
+            )
+
+        updated = repo.get_by_id(transcription_id)
+        assert updated.status == "failed"
+        assert "Worker lost" in updated.error_message
+        assert fake_whisper.results == ["never returned"]  # whisper never ran
+
+
+@pytest.fixture
+def retry_calls(monkeypatch):
+    """record self.retry kwargs, a directly run task would otherwise re-raise exc."""
+    calls = []
+
+    def fake_retry(**kwargs):
+        calls.append(kwargs)
+        return Retry()
+
+    monkeypatch.setattr(transcribe_audio_task, "retry", fake_retry)
+    return calls
+
+
+class TestRetryBackoff:
+    """decorrelated jitter backoff on transcription failures."""
+
+    @pytest.mark.parametrize("prev_delay", [1, 4, 12, 30])
+    def test_next_retry_delay_within_bounds(self, prev_delay):
+        """test that each delay lands in [base, min(cap, prev * 3)]"""
+        upper = min(RETRY_MAX_DELAY_S, prev_delay * 3)
+        for _ in range(50):
+            assert RETRY_BASE_DELAY_S <= next_retry_delay(prev_delay) <= upper
+
+    # uniform pinned to its upper end, so the expected delay is min(cap, prev * 3)
+    @pytest.mark.parametrize(
+        "headers,expected_delay",
+        [
+            ({}, 3),  # first failure starts from the base delay
+            ({"retry_delay": 4}, 12),
+            ({"retry_delay": 12}, RETRY_MAX_DELAY_S),  # capped
+        ],
+        ids=["first_retry", "from_header", "capped"],
+    )
+    def test_failure_retries_with_countdown_and_header(
+        self,
+        monkeypatch,
+        fake_whisper,
+        make_transcriptions,
+        retry_calls,
+        headers,
+        expected_delay,
+    ):
+        """test that a failed task retries with the backoff delay and passes it on in a header"""
+        monkeypatch.setattr(celery_app.random, "uniform", lambda low, high: high)
+        (transcription_id,) = make_transcriptions("retry.mp3")
+        error = Exception("whisper model error")
+        fake_whisper.results = [error]
+
+        # the previous delay arrives in the message headers, as on an eager retry
+        transcribe_audio_task.push_request(headers=headers)
+        try:
+            with pytest.raises(Retry):
+                transcribe_audio_task.run(
+                    file_path="/fake/path.mp3", transcription_id=transcription_id
+                )
+        finally:
+            transcribe_audio_task.pop_request()
+
+        assert retry_calls == [
+            {
+                "exc": error,
+                "countdown": expected_delay,
+                "headers": {"retry_delay": expected_delay},
+            }
+        ]
+
+
+class TestTaskMeta:
+    """status polling reads task meta straight from the redis result backend."""
+
+    def test_get_task_meta_decodes_msgpack(self, monkeypatch):
+        """test that stored msgpack meta is decoded from the task's backend key"""
+        meta = {"status": "SUCCESS", "result": {"text": "hello"}}
+        key = celery_app.celery.backend.get_key_for_task("task-1")
+        store = {key: msgpack.packb(meta)}
+        monkeypatch.setattr(celery_app, "_result_redis", store)
+
+        assert get_task_meta("task-1") == meta
+
+    def test_get_task_meta_missing_is_none(self, monkeypatch):
+        """test that a task with nothing stored yet reads as None (pending)"""
+        monkeypatch.setattr(celery_app, "_result_redis", {})
+
+        assert get_task_meta("task-2") is None
@@ -8,45 +8,105 @@ tests rate limiting enforcement
 catches file descriptor leaks, db deadlocks, partial write issues
 """
 
+import asyncio
+import hashlib
 import io
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from unittest.mock import MagicMock, patch
+import itertools
+import os
+from datetime import datetime, timedelta, timezone
 
-from src.services.file_service import FileService
+import orjson
+import pytest
+
+# uploaded as .mp3 but not mp3 bytes, fails the MIME check
+_FAKE_MP3 = b"not a real mp3 file content" * 100
+
+
+class _FakeResult:
+    """celery AsyncResult stand-in, the api only reads .id"""
+
+    __slots__ = ("id",)
+
+    def __init__(self, task_id):
+        self.id = task_id
+
+
+class _FakeTask:
+    """transcribe_audio_task stand-in, records dispatched task ids without a broker."""
+
+    def __init__(self, fail_after=None):
+        self._ids = itertools.count(1)
+        self.task_ids = []
+        self.fail_after = fail_after  # raise on the call after this many dispatches
+
+    def delay(self, *args, **kwargs):
+        return self.apply_async(args, task_id=f"task-{next(self._ids)}")
+
+    def apply_async(self, args=None, task_id=None, **kwargs):
+        if self.fail_after is not None and len(self.task_ids) >= self.fail_after:
+            raise ConnectionError("broker unreachable")
+        # list.append is atomic, safe from the upload threads
+        self.task_ids.append(task_id)
+        return _FakeResult(task_id)
+
+
+@pytest.fixture(autouse=True)
+def mock_celery(monkeypatch):
+    """plain fake for the celery task so uploads never reach a broker."""
+    fake_task = _FakeTask()
+    monkeypatch.setattr("src.main.transcribe_audio_task", fake_task)
+    return fake_task
+
+
+@pytest.fixture
+def mock_cache_store(monkeypatch):
+    """record store_cached_result calls instead of writing results to redis."""
+    calls = []
+
+    def fake_store(transcription_id, text, task_id):
+        calls.append((transcription_id, text, task_id))
+        return task_id
+
+    monkeypatch.setattr("src.main.store_cached_result", fake_store)
+    return calls
+
+
+def _saved_names(upload_dir, suffix=".mp3"):
+    """names of files saved in the upload dir, one scandir pass without Path objects."""
+    with os.scandir(upload_dir) as entries:
+        return [entry.name for entry in entries if entry.name.endswith(suffix)]
+
+
+def _tasks(response):
+    """tasks from a transcribe response, orjson to match the app's ORJSONResponse."""
+    return orjson.loads(response.content)["tasks"]
+
+
+def _mp3_file(name, data):
+    """multipart tuple for an mp3 upload, BytesIO shares the bytes buffer until written."""
+    return (name, io.BytesIO(data), "audio/mpeg")
 
 
 class TestConcurrentFileUploads:
     """test concurrent file upload race conditions."""
 
-    def test_10_concurrent_uploads_all_succeed(
-        self, test_client, sample_mp3_bytes, temp_upload_dir
+    @pytest.mark.asyncio
+    async def test_10_concurrent_uploads_all_succeed(
+        self, async_client, sample_mp3_bytes, temp_upload_dir
     ):
         """test /api/v1/transcribe endpoint can handle 10 simultaneous file uploads without failing"""
-        # mock celery task to avoid actual processing
-        mock_task = MagicMock()
-        mock_task.id = "test-task-id"
-        mock_task.delay.return_value = mock_task
 
         # sends a fake MP3 upload from in memoty
         def upload_file(file_index):
             """upload a single file."""
             files = {
-                "files": (
-                    f"test_file_{file_index}.mp3",
-                    io.BytesIO(sample_mp3_bytes),
-                    "audio/mpeg",
-                )
+                "files": _mp3_file(f"test_file_{file_index}.mp3", sample_mp3_bytes)
             }
-            return test_client.post("/api/v1/transcribe", files=files)
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
+            return async_client.post("/api/v1/transcribe", files=files)
 
-            # submit uploads concurrently, collect the results as each task completes
-            num_uploads = 10
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(upload_file, i) for i in range(num_uploads)]
-                results = [f.result() for f in as_completed(futures)]
+        # all uploads in flight on one event loop, results come back in order
+        num_uploads = 10
+        results = await asyncio.gather(*map(upload_file, range(num_uploads)))
 
         # all should succeed
         success_count = sum(1 for r in results if r.status_code == 200)
@@ -55,39 +115,28 @@ class TestConcurrentFileUploads:
         ), f"expected {num_uploads} successes, got {success_count}"
 
         # verify all files saved to disk
-        saved_files = list(temp_upload_dir.glob("*.mp3"))
+        saved_names = _saved_names(temp_upload_dir)
         assert (
-            len(saved_files) == num_uploads
-        ), f"expected {num_uploads} files, found {len(saved_files)}"
+            len(saved_names) == num_uploads
+        ), f"expected {num_uploads} files, found {len(saved_names)}"
 
-    def test_all_filenames_unique_under_concurrency(
-        self, test_client, sample_mp3_bytes, temp_upload_dir
+    @pytest.mark.asyncio
+    async def test_all_filenames_unique_under_concurrency(
+        self, async_client, sample_mp3_bytes, temp_upload_dir
     ):
         """test that concurrent uploads generate unique filenames"""
-        mock_task = MagicMock()
-        mock_task.id = "test-task-id"
-        mock_task.delay.return_value = mock_task
 
         def upload_file(file_index):
             # all files have same original name to test collision resistance
-            files = {
-                "files": ("same_name.mp3", io.BytesIO(sample_mp3_bytes), "audio/mpeg")
-            }
-            return test_client.post("/api/v1/transcribe", files=files)
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
+            files = {"files": _mp3_file("same_name.mp3", sample_mp3_bytes)}
+            return async_client.post("/api/v1/transcribe", files=files)
 
-            # concurrent uploads to test uniqueness
-            num_uploads = 10
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(upload_file, i) for i in range(num_uploads)]
-                for future in as_completed(futures):
-                    future.result()
+        # concurrent uploads to test uniqueness
+        num_uploads = 10
+        await asyncio.gather(*map(upload_file, range(num_uploads)))
 
         # verify all filenames are unique
-        saved_files = list(temp_upload_dir.glob("*.mp3"))
-        filenames = [f.name for f in saved_files]
+        filenames = _saved_names(temp_upload_dir)
         unique_filenames = set(filenames)
 
         # len(list) vs len(set(list)) which is depub
@@ -95,46 +144,25 @@ class TestConcurrentFileUploads:
             unique_filenames
         ), f"duplicate filenames detected: {filenames}"
 
-    def test_all_db_records_created_with_unique_ids(
-        self, test_client, sample_mp3_bytes, test_db
+    @pytest.mark.asyncio
+    async def test_all_db_records_created_with_unique_ids(
+        self, async_client, sample_mp3_bytes, test_db
     ):
         """test that concurrent uploads create unique db records"""
-        mock_task = MagicMock()
-        mock_task.id = "test-task-id"
-
-        task_count = [0]
-
-        def mock_delay(*args, **kwargs):
-            task_count[0] += 1
-            mock_result = MagicMock()
-            mock_result.id = f"task-{task_count[0]}"
-            return mock_result
 
         def upload_file(file_index):
-            files = {
-                "files": (
-                    f"db_test_{file_index}.mp3",
-                    io.BytesIO(sample_mp3_bytes),
-                    "audio/mpeg",
-                )
-            }
-            return test_client.post("/api/v1/transcribe", files=files)
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.side_effect = mock_delay
+            files = {"files": _mp3_file(f"db_test_{file_index}.mp3", sample_mp3_bytes)}
+            return async_client.post("/api/v1/transcribe", files=files)
 
-            # concurrent uploads
-            num_uploads = 10
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = [executor.submit(upload_file, i) for i in range(num_uploads)]
-                results = [f.result() for f in as_completed(futures)]
+        # concurrent uploads
+        num_uploads = 10
+        results = await asyncio.gather(*map(upload_file, range(num_uploads)))
 
         # collect all transcription ids from responses
         transcription_ids = []
         for r in results:
             if r.status_code == 200:
-                data = r.json()
-                for task in data["tasks"]:
+                for task in _tasks(r):
                     transcription_ids.append(task["transcription_id"])
 
         # verify all ids are unique
@@ -142,59 +170,29 @@ class TestConcurrentFileUploads:
             set(transcription_ids)
         ), f"duplicate transcription ids: {transcription_ids}"
 
-    def test_mixed_valid_invalid_files_error_isolation(
-        self, test_client, sample_mp3_bytes, temp_upload_dir
+    @pytest.mark.asyncio
+    async def test_mixed_valid_invalid_files_error_isolation(
+        self, async_client, sample_mp3_bytes, temp_upload_dir
     ):
         """test that invalid file failures don't affect valid file processing"""
-        mock_task = MagicMock()
-        mock_task.id = "test-task-id"
-        mock_task.delay.return_value = mock_task
-
-        def upload_valid():
-            files = {"files": ("valid.mp3", io.BytesIO(sample_mp3_bytes), "audio/mpeg")}
-            return ("valid", test_client.post("/api/v1/transcribe", files=files))
-
-        def upload_invalid():
-            # txt file should be rejected
-            files = {
-                "files": ("invalid.txt", io.BytesIO(b"not an mp3 file"), "text/plain")
-            }
-            return ("invalid", test_client.post("/api/v1/transcribe", files=files))
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-
-            # submit mixed batch: 1 valid + 1 invalid
-            num_batch = 1
-            with ThreadPoolExecutor(max_workers=10) as executor:
-                futures = []
-                for i in range(num_batch):
-                    futures.append(executor.submit(upload_valid))
-                    futures.append(executor.submit(upload_invalid))
 
-                results = [f.result() for f in as_completed(futures)]
+        def upload(file):
+            return async_client.post("/api/v1/transcribe", files={"files": file})
 
-        valid_results = [r for (t, r) in results if t == "valid"]
-        invalid_results = [r for (t, r) in results if t == "invalid"]
+        # submit mixed batch: 1 valid + 1 invalid (txt file should be rejected)
+        valid_response, invalid_response = await asyncio.gather(
+            upload(_mp3_file("valid.mp3", sample_mp3_bytes)),
+            upload(("invalid.txt", io.BytesIO(b"not an mp3 file"), "text/plain")),
+        )
 
-        # all valid uploads should succeed
-        valid_successes = sum(1 for r in valid_results if r.status_code == 200)
-        assert (
-            valid_successes == num_batch
-        ), f"expected {num_batch} valid successes, got {valid_successes}"
-
-        # all invalid uploads should fail with 400
-        invalid_failures = sum(1 for r in invalid_results if r.status_code == 400)
-        assert (
-            invalid_failures == num_batch
-        ), f"expected {num_batch} invalid failures, got {invalid_failures}"
+        # valid upload should succeed, invalid one should fail with 400
+        assert valid_response.status_code == 200
+        assert invalid_response.status_code == 400
 
     def test_no_partial_writes_on_failure(self, test_client, temp_upload_dir):
         """test that failed uploads don't leave partial files"""
-        # create file that will fail mime validation
-        fake_mp3 = b"not a real mp3 file content" * 100
-
-        files = {"files": ("fake.mp3", io.BytesIO(fake_mp3), "audio/mpeg")}
+        # file that will fail mime validation
+        files = {"files": _mp3_file("fake.mp3", _FAKE_MP3)}
         # test_client in conftest
         response = test_client.post("/api/v1/transcribe", files=files)
 
@@ -207,43 +205,30 @@ class TestConcurrentFileUploads:
         # if not rate limited, verify no files left in upload directory
         # If the server rejects the file, it should not leave a partial file in the upload directory.
         if response.status_code == 400:
-            saved_files = list(temp_upload_dir.glob("*"))
-            assert len(saved_files) == 0, f"partial files left: {saved_files}"
+            # any suffix, a leftover .tmp is a partial write too
+            saved_names = _saved_names(temp_upload_dir, suffix="")
+            assert len(saved_names) == 0, f"partial files left: {saved_names}"
 
-    def test_task_ids_returned_for_all_uploads(self, test_client, sample_mp3_bytes):
+    @pytest.mark.asyncio
+    async def test_task_ids_returned_for_all_uploads(
+        self, async_client, sample_mp3_bytes
+    ):
         """test that each upload returns a unique task id"""
-        task_counter = [0]
-
-        def mock_delay(*args, **kwargs):
-            task_counter[0] += 1
-            mock_result = MagicMock()
-            mock_result.id = f"task-{task_counter[0]}"
-            return mock_result
 
         def upload_file(file_index):
             files = {
-                "files": (
-                    f"task_test_{file_index}.mp3",
-                    io.BytesIO(sample_mp3_bytes),
-                    "audio/mpeg",
-                )
+                "files": _mp3_file(f"task_test_{file_index}.mp3", sample_mp3_bytes)
             }
-            return test_client.post("/api/v1/transcribe", files=files)
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.side_effect = mock_delay
+            return async_client.post("/api/v1/transcribe", files=files)
 
-            num_uploads = 5
-            with ThreadPoolExecutor(max_workers=5) as executor:
-                futures = [executor.submit(upload_file, i) for i in range(num_uploads)]
-                results = [f.result() for f in as_completed(futures)]
+        num_uploads = 5
+        results = await asyncio.gather(*map(upload_file, range(num_uploads)))
 
         # collect all task ids
         task_ids = []
         for r in results:
             if r.status_code == 200:
-                data = r.json()
-                for task in data["tasks"]:
+                for task in _tasks(r):
                     task_ids.append(task["task_id"])
 
         # verify all successful uploads have unique task ids
@@ -253,34 +238,27 @@ class TestConcurrentFileUploads:
             ), f"duplicate task ids: {task_ids}"
         # if rate limited, task_ids will be empty, which is acceptable
 
-    def test_filename_timestamp_token_uniqueness(self, temp_upload_dir):
+    def test_filename_timestamp_token_uniqueness(self, file_service):
         """test that generate_unique_filename produces unique names rapidly"""
-        file_service = FileService()
-        file_service._upload_dir = temp_upload_dir
 
-        # generate 100 filenames rapidly with same original name
-        filenames = []
-        for _ in range(100):
-            filename = file_service.generate_unique_filename("same_name.mp3")
-            filenames.append(filename)
+        # generate 100 filenames rapidly with same original name, a set keeps only distinct ones
+        filenames = {
+            file_service.generate_unique_filename("same_name.mp3") for _ in range(100)
+        }
 
         # all should be unique
-        assert len(filenames) == len(
-            set(filenames)
-        ), "duplicate filenames in rapid generation"
+        assert len(filenames) == 100, "duplicate filenames in rapid generation"
 
-    def test_concurrent_filename_generation_thread_safe(self, temp_upload_dir):
+    def test_concurrent_filename_generation_thread_safe(
+        self, file_service, upload_executor
+    ):
         """test that filename generation is thread-safe"""
-        file_service = FileService()
-        file_service._upload_dir = temp_upload_dir
 
         def generate_filename(index):
             return file_service.generate_unique_filename("concurrent.mp3")
 
         # same name = race = not thread safe
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [executor.submit(generate_filename, i) for i in range(100)]
-            filenames = [f.result() for f in as_completed(futures)]
+        filenames = list(upload_executor.map(generate_filename, range(100)))
 
         # all should be unique
         assert len(filenames) == len(
@@ -292,55 +270,50 @@ class TestConcurrentFileUploads:
     ):
         """test uploading multiple files in a single request"""
 
-        task_counter = [0]
-
-        def mock_delay(*args, **kwargs):
-            task_counter[0] += 1
-            mock_result = MagicMock()
-            mock_result.id = f"batch-task-{task_counter[0]}"
-            return mock_result
-
         # create multiple files in single request
         num_files = 5
         files = [
-            ("files", (f"batch_{i}.mp3", io.BytesIO(sample_mp3_bytes), "audio/mpeg"))
+            ("files", _mp3_file(f"batch_{i}.mp3", sample_mp3_bytes))
             for i in range(num_files)
         ]
 
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.side_effect = mock_delay
-            response = test_client.post("/api/v1/transcribe", files=files)
+        response = test_client.post("/api/v1/transcribe", files=files)
 
         if response.status_code == 200:
             data = response.json()
             assert len(data["tasks"]) == num_files
 
             # verify all files saved
-            saved_files = list(temp_upload_dir.glob("*.mp3"))
-            assert len(saved_files) == num_files
+            assert len(_saved_names(temp_upload_dir)) == num_files
+
+    def test_10_files_single_request_unique_filenames(
+        self, test_client, sample_mp3_bytes, temp_upload_dir
+    ):
+        """test 10 same-named files in one request get unique names, one dispatch instead of 10"""
+        num_files = 10
+        files = [
+            ("files", _mp3_file("same_name.mp3", sample_mp3_bytes))
+            for _ in range(num_files)
+        ]
+
+        response = test_client.post("/api/v1/transcribe", files=files)
+
+        assert response.status_code == 200
+        tasks = response.json()["tasks"]
+        assert len(tasks) == num_files
+        assert len({task["transcription_id"] for task in tasks}) == num_files
+        assert len(set(_saved_names(temp_upload_dir))) == num_files
 
     def test_response_under_load(self, test_client, sample_mp3_bytes):
         """test basic robustness under a small burst (no crashes/timeouts) and that there is valid status 200/429."""
-        mock_task = MagicMock()
-        mock_task.id = "rate-test-task"
-        mock_task.delay.return_value = mock_task
 
         def upload_file(index):
-            files = {
-                "files": (
-                    f"rate_{index}.mp3",
-                    io.BytesIO(sample_mp3_bytes),
-                    "audio/mpeg",
-                )
-            }
+            files = {"files": _mp3_file(f"rate_{index}.mp3", sample_mp3_bytes)}
             return test_client.post("/api/v1/transcribe", files=files)
 
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-
-            results = []
-            for i in range(3):
-                results.append(upload_file(i))
+        results = []
+        for i in range(3):
+            results.append(upload_file(i))
 
         # verify we got responses (either 200 or 429)
         # by right should not 429 as limiter.enabled = False set in conftest.py
@@ -353,23 +326,13 @@ class TestConcurrentFileUploads:
 class TestFileValidations:
     """Test file validation functions."""
 
-    def test_file_size_validation_rejects_oversized_files(self, test_client):
+    def test_file_size_validation_rejects_oversized_files(
+        self, test_client, large_mp3_bytes
+    ):
         """Test that files exceeding size limit are rejected."""
-        # add 1kb to the settings.max_upload_size_bytes
-        from src.utils.settings import get_settings
-
-        settings = get_settings()
-        oversized_data = b"\xff\xfb\x90\x00" * (settings.max_upload_size_bytes + 1024)
+        files = {"files": _mp3_file("large.mp3", large_mp3_bytes)}
 
-        mock_task = MagicMock()
-        mock_task.id = "size-test"
-        mock_task.delay.return_value = mock_task
-
-        files = {"files": ("large.mp3", io.BytesIO(oversized_data), "audio/mpeg")}
-
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-            response = test_client.post("/api/v1/transcribe", files=files)
+        response = test_client.post("/api/v1/transcribe", files=files)
 
         assert response.status_code == 413
         assert "File too large" in response.json()["detail"]
@@ -379,7 +342,7 @@ class TestFileValidations:
     ):
         """Test that invalid file extensions are rejected."""
         # mime and bytes is mp3 but extension is .exe
-        files = {"files": ("malware.exe", io.BytesIO(sample_mp3_bytes), "audio/mpeg")}
+        files = {"files": _mp3_file("malware.exe", sample_mp3_bytes)}
         response = test_client.post("/api/v1/transcribe", files=files)
 
         assert response.status_code == 400
@@ -391,138 +354,182 @@ class TestFileValidations:
         """Test that MIME type spoofing is detected."""
         # File named .mp3 but actually an exe
         # mime and name is mp3 but btyes not mp3
-        files = {"files": ("fake.mp3", io.BytesIO(invalid_file_bytes), "audio/mpeg")}
+        files = {"files": _mp3_file("fake.mp3", invalid_file_bytes)}
         response = test_client.post("/api/v1/transcribe", files=files)
 
         assert response.status_code == 400
         assert "Invalid audio format" in response.json()["detail"]
 
-    def test_filename_sanitization_blocks_path_traversal(
-        self, test_client, sample_mp3_bytes, temp_upload_dir
+    @pytest.mark.parametrize(
+        "filename,forbidden",
+        [
+            ("../../etc/passwd.mp3", ("..", "/")),  # path traversal
+            ("evil.exe\x00.mp3", ("\x00",)),  # null byte
+            ("test<script>.mp3", ("<", ">")),  # special chars
+        ],
+        ids=["path_traversal", "null_bytes", "special_chars"],
+    )
+    def test_filename_sanitization(
+        self, test_client, sample_mp3_bytes, temp_upload_dir, filename, forbidden
     ):
-        """Test that path traversal in filenames is blocked."""
-        mock_task = MagicMock()
-        mock_task.id = "sanitize-test"
-        mock_task.delay.return_value = mock_task
-
-        files = {
-            "files": (
-                "../../etc/passwd.mp3",
-                io.BytesIO(sample_mp3_bytes),
-                "audio/mpeg",
-            )
-        }
+        """Test that unsafe filenames are sanitized before saving."""
+        files = {"files": _mp3_file(filename, sample_mp3_bytes)}
 
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-            response = test_client.post("/api/v1/transcribe", files=files)
+        response = test_client.post("/api/v1/transcribe", files=files)
 
-        # Should succeed
         assert response.status_code == 200
 
-        # Verify the actual saved file doesn't have path traversal
-        # should be passwd.mp3
-        # Check files saved to temp directory
-        saved_files = list(temp_upload_dir.glob("*.mp3"))
-        assert len(saved_files) == 1
-        saved_filename = saved_files[0].name
-        assert ".." not in saved_filename
-        assert "/" not in saved_filename
+        # the response echoes the original name, the saved file is what gets sanitized
+        saved_names = _saved_names(temp_upload_dir)
+        assert len(saved_names) == 1
+        saved_filename = saved_names[0]
+        for chars in forbidden:
+            assert chars not in saved_filename
 
-    def test_filename_sanitization_removes_null_bytes(
-        self, test_client, sample_mp3_bytes
+
+@pytest.fixture
+def rate_limited(test_client, monkeypatch):
+    """turn the limiter back on with a low limit, monkeypatch restores both afterwards."""
+    from src.main import limiter, settings
+
+    # depends on test_client so this is undone before test_client's own teardown
+    monkeypatch.setattr(limiter, "enabled", True)
+    monkeypatch.setattr(settings, "transcribe_rate_limit", "5/minute")
+    return test_client
+
+
+class TestRateLimiting:
+    """Test API rate limiting."""
+
+    def test_rate_limit_enforcement(self, rate_limited, sample_mp3_bytes):
+        """Test that rate limiting prevents excessive requests."""
+        # at least some should be rate limited
+        responses = []
+        for i in range(10):
+            files = {"files": _mp3_file(f"test_{i}.mp3", sample_mp3_bytes)}
+            response = rate_limited.post("/api/v1/transcribe", files=files)
+            responses.append(response)
+
+        # Verify we got some 200s and some 429s
+        status_codes = [r.status_code for r in responses]
+        assert 200 in status_codes, "At least one request should succeed"
+        assert 429 in status_codes, "Rate limiting should kick in"
+
+        # Verify the 429 response indicates rate limiting
+        rate_limited_responses = [r for r in responses if r.status_code == 429]
+        if rate_limited_responses:
+            # SlowAPI returns error in "error" key or plain text
+            response_text = rate_limited_responses[0].text
+            assert "limit" in response_text.lower() or "rate" in response_text.lower()
+
+
+class TestDuplicateUploads:
+    """Test reuse of completed transcriptions for identical audio."""
+
+    def test_duplicate_audio_reuses_completed_transcription(
+        self,
+        test_client,
+        sample_mp3_bytes,
+        test_db,
+        repo,
+        mock_celery,
+        mock_cache_store,
+        temp_upload_dir,
     ):
-        """Test that null bytes in filenames are removed."""
-        mock_task = MagicMock()
-        mock_task.id = "null-byte-test"
-        mock_task.delay.return_value = mock_task
+        """Test that re-uploading transcribed audio skips the whisper task."""
+        repo.bulk_create(
+            ["first.mp3"],
+            content_hashes=[hashlib.sha256(sample_mp3_bytes).hexdigest()],
+        )
+        original = repo.get_rows()[0]
+        repo.finalize(original["id"], "completed", text="already transcribed")
 
-        files = {
-            "files": ("evil.exe\x00.mp3", io.BytesIO(sample_mp3_bytes), "audio/mpeg")
-        }
+        files = {"files": _mp3_file("again.mp3", sample_mp3_bytes)}
 
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-            response = test_client.post("/api/v1/transcribe", files=files)
+        response = test_client.post("/api/v1/transcribe", files=files)
 
         assert response.status_code == 200
-        saved_filename = response.json()["tasks"][0]["filename"]
-        assert "\x00" not in saved_filename
+        task = response.json()["tasks"][0]
+        assert task["status"] == "completed"
+        assert mock_celery.task_ids == []
+        # meta is published under the id the row was inserted with
+        assert mock_cache_store == [
+            (task["transcription_id"], "already transcribed", task["task_id"])
+        ]
+        # duplicate upload is dropped, whisper never reads it
+        assert _saved_names(temp_upload_dir) == []
 
-    def test_filename_sanitization_replaces_special_chars(
-        self, test_client, sample_mp3_bytes, temp_upload_dir
+        test_db.expire_all()
+        duplicate = repo.get_by_id(task["transcription_id"])
+        assert duplicate.status == "completed"
+        assert duplicate.transcribed_text == "already transcribed"
+        assert duplicate.task_id == task["task_id"]
+
+    def test_cache_store_failure_keeps_completed_row(
+        self, test_client, sample_mp3_bytes, test_db, repo, monkeypatch
     ):
-        """Test that special characters are replaced."""
-        mock_task = MagicMock()
-        mock_task.id = "special-char-test"
-        mock_task.delay.return_value = mock_task
+        """test that a redis error after the commit doesn't fail the upload"""
+        repo.bulk_create(
+            ["first.mp3"],
+            content_hashes=[hashlib.sha256(sample_mp3_bytes).hexdigest()],
+        )
+        repo.finalize(repo.get_rows()[0]["id"], "completed", text="already transcribed")
 
-        files = {
-            "files": ("test<script>.mp3", io.BytesIO(sample_mp3_bytes), "audio/mpeg")
-        }
+        def failing_store(*args):
+            raise ConnectionError("redis down")
+
+        monkeypatch.setattr("src.main.store_cached_result", failing_store)
+        files = {"files": _mp3_file("again.mp3", sample_mp3_bytes)}
 
-        with patch("src.main.transcribe_audio_task") as mock_celery:
-            mock_celery.delay.return_value = mock_task
-            response = test_client.post("/api/v1/transcribe", files=files)
+        response = test_client.post("/api/v1/transcribe", files=files)
 
         assert response.status_code == 200
+        task = response.json()["tasks"][0]
+        test_db.expire_all()
+        duplicate = repo.get_by_id(task["transcription_id"])
+        assert duplicate.status == "completed"
+        assert duplicate.task_id == task["task_id"]
 
-        # Verify the actual saved file doesn't have special chars
-        saved_files = list(temp_upload_dir.glob("*.mp3"))
-        assert len(saved_files) == 1
-        saved_filename = saved_files[0].name
-        assert "<" not in saved_filename
-        assert ">" not in saved_filename
 
+class TestDispatchFailure:
+    """Test rows left behind when the broker fails mid batch."""
 
-class TestRateLimiting:
-    """Test API rate limiting."""
+    def test_broker_failure_keeps_queued_ids_and_fails_the_rest(
+        self, test_client, sample_mp3_bytes, test_db, repo, mock_celery
+    ):
+        """test that queued rows keep their task ids and undispatched rows are failed"""
+        mock_celery.fail_after = 1
+        files = [
+            ("files", _mp3_file("first.mp3", sample_mp3_bytes)),
+            ("files", _mp3_file("second.mp3", sample_mp3_bytes + b"\x00")),
+        ]
 
-    def test_rate_limit_enforcement(self, test_client, sample_mp3_bytes):
-        """Test that rate limiting prevents excessive requests."""
-        from src.main import limiter, settings
-
-        # Enable rate limiting for this specific test
-        limiter.enabled = True
-        original_limit = settings.transcribe_rate_limit
-        settings.transcribe_rate_limit = "5/minute"
-
-        try:
-            mock_task = MagicMock()
-            mock_task.id = "rate-limit-test"
-            mock_task.delay.return_value = mock_task
-
-            with patch("src.main.transcribe_audio_task") as mock_celery:
-                mock_celery.delay.return_value = mock_task
-
-                # at least some should be rate limited
-                responses = []
-                for i in range(10):
-                    files = {
-                        "files": (
-                            f"test_{i}.mp3",
-                            io.BytesIO(sample_mp3_bytes),
-                            "audio/mpeg",
-                        )
-                    }
-                    response = test_client.post("/api/v1/transcribe", files=files)
-                    responses.append(response)
-
-                # Verify we got some 200s and some 429s
-                status_codes = [r.status_code for r in responses]
-                assert 200 in status_codes, "At least one request should succeed"
-                assert 429 in status_codes, "Rate limiting should kick in"
-
-                # Verify the 429 response indicates rate limiting
-                rate_limited = [r for r in responses if r.status_code == 429]
-                if rate_limited:
-                    # SlowAPI returns error in "error" key or plain text
-                    response_text = rate_limited[0].text
-                    assert (
-                        "limit" in response_text.lower()
-                        or "rate" in response_text.lower()
-                    )
-        finally:
-            # Disable rate limiting again for other tests
-            limiter.enabled = False
-            settings.transcribe_rate_limit = original_limit
+        response = test_client.post("/api/v1/transcribe", files=files)
+
+        assert response.status_code == 503
+        test_db.expire_all()
+        rows = {row["task_id"]: row for row in repo.get_rows()}
+        (queued_id,) = mock_celery.task_ids
+        assert rows.pop(queued_id)["status"] == "processing"
+        (failed,) = rows.values()
+        assert failed["status"] == "failed"
+        assert failed["error_message"] == "Could not queue transcription task"
+
+
+class TestTimestamps:
+    """Test created timestamps are returned with their utc offset."""
+
+    @pytest.mark.parametrize("include_text", [True, False])
+    def test_list_timestamps_are_utc(self, test_client, sample_mp3_bytes, include_text):
+        """test that created_timestamp carries +00:00 and matches the current utc time"""
+        files = {"files": _mp3_file("when.mp3", sample_mp3_bytes)}
+        assert test_client.post("/api/v1/transcribe", files=files).status_code == 200
+
+        response = test_client.get(
+            "/api/v1/transcriptions", params={"include_text": include_text}
+        )
+
+        (row,) = response.json()
+        created = datetime.fromisoformat(row["created_timestamp"])
+        assert created.utcoffset() == timedelta(0)
+        assert abs(datetime.now(timezone.utc) - created) < timedelta(minutes=1)